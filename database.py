@@ -1,8 +1,24 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///3dprint.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///3dprint.db")
 
-engine = create_engine(DATABASE_URL, echo=True)
+def create_db_engine(url: str = DATABASE_URL, **kwargs):
+    engine = create_engine(url, pool_pre_ping=True, **kwargs)
+
+    if engine.dialect.name == "sqlite":
+        # WAL permite lectores concurrentes mientras otro proceso escribe
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA busy_timeout=5000")
+            cur.close()
+
+    return engine
+
+engine = create_db_engine(DATABASE_URL, echo=True)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
\ No newline at end of file
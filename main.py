@@ -1,13 +1,17 @@
 import sys
 from PySide6.QtWidgets import QApplication
-from database import Base, engine
+from database import engine
+from services.migrations import migrate
+from services.archive import ArchiveWorker
 from ui.main_window import MainWindow
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
-
 if __name__ == "__main__":
+    # Crear tablas y aplicar migraciones pendientes; solo al arrancar la
+    # aplicacion, no al importar el modulo (p. ej. en los procesos del pool)
+    migrate(engine)
     app = QApplication(sys.argv)
+    archiver = ArchiveWorker()
+    archiver.start()
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, DateTime, Date, Boolean, Index, event, update, insert, inspect
+from sqlalchemy.orm import relationship, Session
 from database import Base
 from datetime import datetime
 
@@ -14,9 +14,12 @@ class Filament(Base):
     initial_g = Column(Integer, nullable=False, default=1000)
     remaining_g_effective = Column(Integer, nullable=False, default=1000)
     remaining_g_projected = Column(Integer, nullable=False, default=1000)
-    
+    version = Column(Integer, nullable=False, server_default="1")  # bloqueo optimista
+
     print_job = relationship("PrintJob", back_populates="filament")
 
+    __mapper_args__ = {"version_id_col": version}
+
 class Printer(Base):
     __tablename__ = "printers"
 
@@ -25,16 +28,31 @@ class Printer(Base):
     price = Column(Integer, nullable=False)
     wear_per_hour = Column(Float, nullable=False)  # USD/h o CLP/h
     power_kwh_per_hour = Column(Float, nullable=False)  # kWh/h
+    api_type = Column(String(32), nullable=True)  # octoprint|moonraker
+    api_url = Column(String(255), nullable=True)
+    api_key = Column(String(120), nullable=True)
 
     print_job = relationship("PrintJob", back_populates="printer")
 
+class Asset(Base):
+    __tablename__ = "assets"
+
+    hash = Column(String(64), primary_key=True)  # sha256 del contenido original
+    size = Column(Integer, nullable=False)
+    stored_size = Column(Integer, nullable=False)
+    compression = Column(String(8), nullable=True)  # zstd|gzip|None
+    original_name = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Object3D(Base):
     __tablename__ = "objects"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(160), nullable=False)
     stl_path = Column(String(255), nullable=False)
-    gcode_path = Column(String(255), nullable=False)
+    gcode_path = Column(String(255), nullable=False, index=True)
+    stl_hash = Column(String(64), ForeignKey("assets.hash"), nullable=True, index=True)
+    gcode_hash = Column(String(64), ForeignKey("assets.hash"), nullable=True, index=True)
     objects = Column(Integer, nullable=False, default=1)
     weight_grams = Column(Integer, nullable=False)
     print_time_hours = Column(Float, nullable=False)
@@ -45,6 +63,16 @@ class Object3D(Base):
 
 class PrintJob(Base):
     __tablename__ = "print_jobs"
+    __table_args__ = (
+        Index("ix_print_jobs_status_created_at", "status", "created_at"),
+        Index("ix_print_jobs_status_completed_at", "status", "completed_at"),
+        Index("ix_print_jobs_filament_id_status", "filament_id", "status"),
+        Index("ix_print_jobs_printer_id_status_created_at", "printer_id", "status", "created_at"),
+        Index("ix_print_jobs_object_id", "object_id"),
+        Index("ix_print_jobs_printer_id_status_planned_end", "printer_id", "status", "planned_end"),
+        # sin AUTOINCREMENT SQLite reutiliza los ids de los trabajos archivados
+        {"sqlite_autoincrement": True},
+    )
 
     now = datetime.utcnow
 
@@ -58,11 +86,68 @@ class PrintJob(Base):
     status = Column(String(32), nullable=False, default="queued")  # queued|printing|done|canceled
     created_at = Column(DateTime, default=now)
     completed_at = Column(DateTime, default=now)
+    planned_start = Column(DateTime, nullable=True)  # turno planificado en la impresora
+    planned_end = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)     # inicio real
+    copies_done = Column(Integer, nullable=False, server_default="0")  # copias terminadas segun la impresora
+    version = Column(Integer, nullable=False, server_default="1")  # bloqueo optimista
 
     object = relationship("Object3D", back_populates="print_job")
     printer = relationship("Printer", back_populates="print_job")
     filament = relationship("Filament", back_populates="print_job")
 
+    __mapper_args__ = {"version_id_col": version}
+
+class PrintJobArchive(Base):
+    __tablename__ = "print_jobs_archive"
+    __table_args__ = (
+        Index("ix_print_jobs_archive_status_completed_at", "status", "completed_at"),
+    )
+
+    archive_id = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(Integer, nullable=False, index=True)  # id original en print_jobs
+    object_id = Column(Integer, nullable=False, index=True)
+    filament_id = Column(Integer, nullable=False, index=True)
+    printer_id = Column(Integer, nullable=False, index=True)
+    quantity = Column(Integer, nullable=False, default=1)
+    hours = Column(Float, nullable=False)
+    filament_used_g = Column(Integer, nullable=False)
+    status = Column(String(32), nullable=False)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    planned_start = Column(DateTime)
+    planned_end = Column(DateTime)
+    started_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class JobRollup(Base):
+    __tablename__ = "job_rollups"
+
+    day = Column(Date, primary_key=True)
+    object_id = Column(Integer, primary_key=True)
+    filament_id = Column(Integer, primary_key=True)
+    printer_id = Column(Integer, primary_key=True)
+    status = Column(String(32), primary_key=True)
+    jobs = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    hours = Column(Float, nullable=False, default=0.0)
+    filament_g = Column(Integer, nullable=False, default=0)
+
+class WatchedFile(Base):
+    __tablename__ = "watched_files"
+
+    path = Column(String(255), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    object_id = Column(Integer, nullable=True)
+    indexed_at = Column(DateTime, default=datetime.utcnow)
+
+class ReferenceVersion(Base):
+    __tablename__ = "reference_versions"
+
+    kind = Column(String(32), primary_key=True)  # nombre de la tabla
+    version = Column(Integer, nullable=False, default=0)
+
 class GlobalConfig(Base):
     __tablename__ = "global_config"
 
@@ -73,4 +158,42 @@ class GlobalConfig(Base):
     manual_printer_cost = Column(Float, nullable=True)   # $/hora desgaste
     manual_energy_cost = Column(Float, nullable=True)    # $/hora electricidad
     manual_profit_margin = Column(Float, nullable=True)         # margen de ganacia
-    use_manual = Column(Boolean, default=False)          # Si usar manual o promedios
\ No newline at end of file
+    use_manual = Column(Boolean, default=False)          # Si usar manual o promedios
+    archive_after_days = Column(Integer, default=90)     # dias antes de archivar trabajos terminados
+
+# Tablas de catalogo cacheadas por services.reference_data, con las columnas
+# que guarda el cache: un flush del ORM que inserte, borre o cambie alguna de
+# esas columnas sube la version de la tabla, en la misma transaccion. Los
+# cambios en otras columnas o en colecciones (p. ej. al crear un PrintJob)
+# no invalidan el cache.
+REFERENCE_COLUMNS = {
+    "objects": ("name", "weight_grams", "print_time_hours"),
+    "filaments": ("name", "material", "color"),
+    "printers": ("name",),
+}
+REFERENCE_TABLES = tuple(REFERENCE_COLUMNS)
+
+def _catalog_changed(obj) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in REFERENCE_COLUMNS[obj.__tablename__])
+
+@event.listens_for(Session, "after_flush")
+def _bump_reference_versions(session, _flush_context):
+    touched = {
+        obj.__tablename__
+        for obj in (*session.new, *session.deleted)
+        if getattr(obj, "__tablename__", None) in REFERENCE_COLUMNS
+    }
+    touched.update(
+        obj.__tablename__
+        for obj in session.dirty
+        if getattr(obj, "__tablename__", None) in REFERENCE_COLUMNS and _catalog_changed(obj)
+    )
+    if not touched:
+        return
+    t = ReferenceVersion.__table__
+    conn = session.connection()
+    for kind in sorted(touched):
+        result = conn.execute(update(t).where(t.c.kind == kind).values(version=t.c.version + 1))
+        if result.rowcount == 0:
+            conn.execute(insert(t).values(kind=kind, version=1))
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from sqlalchemy.orm import sessionmaker
+
+from database import DATABASE_URL, create_db_engine
+from models import Object3D, Filament, Printer, PrintJob
+from services.migrations import migrate
+from services.queue_ops import ACTIONS, enqueue_job, process_job_by_id
+from services.reservations import with_retry, InsufficientFilament, ConcurrentUpdate
+from services.bulk_enqueue import OrderLine, OrderError, enqueue_many
+from services.quoting import load_quote_inputs, top_k_quotes
+
+# Modo servicio: API HTTP/JSON local sobre la misma capa de datos que la app.
+#
+#   python -m services.api_server --port 8080
+#
+# Los GET se cachean en memoria con ETag; cualquier escritura de la API
+# invalida la cache. CACHE_TTL acota cuanto tarda en verse una escritura
+# hecha desde fuera (por ejemplo, la app de escritorio).
+
+log = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.environ.get("API_DB_POOL_SIZE", "8"))
+CACHE_TTL = float(os.environ.get("API_CACHE_TTL", "2.0"))
+ACTIVE_STATUSES = ("pending", "printing")
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.inflight = {}
+        self.version = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+    def put(self, key, etag: str, body: bytes):
+        self.entries[key] = (time.monotonic() + self.ttl, etag, body)
+
+    def invalidate(self):
+        self.version += 1
+        self.entries.clear()
+
+
+def _etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def _render(producer):
+    body = json.dumps(producer(), default=str).encode()
+    return _etag(body), body
+
+
+def _json(data, status: int = 200) -> web.Response:
+    return web.json_response(data, status=status, dumps=lambda d: json.dumps(d, default=str))
+
+
+def _error(status: int, msg: str) -> web.Response:
+    return _json({"error": msg}, status=status)
+
+
+def _rows(session, columns, *criteria, order_by=None):
+    q = session.query(*columns).filter(*criteria).order_by(order_by if order_by is not None else columns[0])
+    keys = [c.key for c in columns]
+    return [dict(zip(keys, row)) for row in q]
+
+
+def _job_dict(job: PrintJob) -> dict:
+    return dict(
+        id=job.id,
+        object_id=job.object_id,
+        filament_id=job.filament_id,
+        printer_id=job.printer_id,
+        quantity=job.quantity,
+        hours=job.hours,
+        filament_used_g=job.filament_used_g,
+        status=job.status,
+        created_at=job.created_at,
+        completed_at=job.completed_at,
+    )
+
+
+class ApiServer:
+    def __init__(self, url: str = DATABASE_URL, pool_size: int = DB_POOL_SIZE, cache_ttl: float = CACHE_TTL):
+        if url == "sqlite://" or ":memory:" in url:
+            self.engine = create_db_engine(url)
+        else:
+            self.engine = create_db_engine(url, pool_size=pool_size, max_overflow=pool_size)
+        migrate(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+        self.cache = ResponseCache(cache_ttl)
+
+    async def _db(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def _cached(self, request: web.Request, producer) -> web.Response:
+        key = request.path_qs
+        hit = self.cache.get(key)
+        if hit is None:
+            # una sola consulta por clave aunque lleguen muchas peticiones
+            # juntas; por version, para no unirse a una lectura empezada antes
+            # de una escritura
+            version = self.cache.version
+            flight = (key, version)
+            pending = self.cache.inflight.get(flight)
+            if pending is None:
+                pending = asyncio.ensure_future(self._db(_render, producer))
+                self.cache.inflight[flight] = pending
+                pending.add_done_callback(lambda _f: self.cache.inflight.pop(flight, None))
+                hit = await asyncio.shield(pending)
+                if version == self.cache.version:
+                    self.cache.put(key, *hit)
+            else:
+                hit = await asyncio.shield(pending)
+
+        etag, body = hit
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    # --- lectura ---
+
+    async def list_objects(self, request):
+        def producer():
+            with self.Session() as s:
+                return _rows(s, (
+                    Object3D.id, Object3D.name, Object3D.stl_path, Object3D.gcode_path, Object3D.objects,
+                    Object3D.weight_grams, Object3D.print_time_hours, Object3D.cost, Object3D.suggested_price,
+                ))
+        return await self._cached(request, producer)
+
+    async def list_filaments(self, request):
+        def producer():
+            with self.Session() as s:
+                return _rows(s, (
+                    Filament.id, Filament.name, Filament.color, Filament.material, Filament.price,
+                    Filament.initial_g, Filament.remaining_g_effective, Filament.remaining_g_projected,
+                ))
+        return await self._cached(request, producer)
+
+    async def list_printers(self, request):
+        def producer():
+            with self.Session() as s:
+                return _rows(s, (
+                    Printer.id, Printer.name, Printer.price, Printer.wear_per_hour, Printer.power_kwh_per_hour,
+                ))
+        return await self._cached(request, producer)
+
+    async def list_jobs(self, request):
+        statuses = request.query.getall("status", list(ACTIVE_STATUSES))
+
+        def producer():
+            with self.Session() as s:
+                return _rows(s, (
+                    PrintJob.id, PrintJob.object_id, PrintJob.filament_id, PrintJob.printer_id, PrintJob.quantity,
+                    PrintJob.hours, PrintJob.filament_used_g, PrintJob.status, PrintJob.created_at, PrintJob.completed_at,
+                ), PrintJob.status.in_(statuses))
+        return await self._cached(request, producer)
+
+    async def quotes(self, request):
+        try:
+            object_ids = [int(v) for v in request.query.getall("object_id", [])] or None
+            k = int(request.query.get("k", "5"))
+        except ValueError:
+            return _error(400, "object_id y k deben ser enteros")
+        if k < 1:
+            return _error(400, "k debe ser al menos 1")
+
+        def producer():
+            with self.Session() as s:
+                result = top_k_quotes(load_quote_inputs(s, object_ids), k)
+            return [
+                dict(
+                    object_id=int(oid),
+                    options=[
+                        dict(filament_id=int(f), printer_id=int(p), cost=int(c), suggested_price=int(sp))
+                        for f, p, c, sp in zip(result.filament_ids[i], result.printer_ids[i], result.cost[i], result.suggested_price[i])
+                    ],
+                )
+                for i, oid in enumerate(result.object_ids)
+            ]
+        return await self._cached(request, producer)
+
+    # --- escritura ---
+
+    async def create_job(self, request):
+        try:
+            payload = await request.json()
+            object_id = int(payload["object_id"])
+            filament_id = int(payload["filament_id"])
+            printer_id = int(payload["printer_id"])
+            quantity = int(payload.get("quantity", 1))
+        except (ValueError, KeyError, TypeError):
+            return _error(400, "Se requieren object_id, filament_id, printer_id y quantity")
+        if quantity < 1:
+            return _error(400, "quantity debe ser mayor que 0")
+
+        def work():
+            with self.Session() as s:
+                obj = s.get(Object3D, object_id)
+                filament = s.get(Filament, filament_id)
+                printer = s.get(Printer, printer_id)
+                if not (obj and filament and printer):
+                    return None
+                job = enqueue_job(s, obj, filament, printer, quantity)
+                s.commit()
+                return _job_dict(job)
+
+        try:
+            job = await self._db(work)
+        except InsufficientFilament as e:
+            return _error(409, str(e))
+        if job is None:
+            return _error(404, "Objeto, filamento o impresora no encontrado")
+        self.cache.invalidate()
+        return _json(job, status=201)
+
+    async def create_jobs(self, request):
+        # {"lines": [{"object_id", "filament_id", "printer_id", "quantity"}, ...]}
+        try:
+            payload = await request.json()
+            lines = [
+                OrderLine(int(item["object_id"]), int(item["filament_id"]), int(item["printer_id"]), int(item.get("quantity", 1)), n)
+                for n, item in enumerate(payload["lines"], start=1)
+            ]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return _error(400, "Se requiere lines: [{object_id, filament_id, printer_id, quantity}]")
+
+        def work():
+            with self.Session() as s:
+                count = enqueue_many(s, lines)
+                s.commit()
+                return count
+
+        try:
+            count = await self._db(work)
+        except OrderError as e:
+            return _json({"error": "Pedido no válido", "lines": e.errors}, status=400)
+        except InsufficientFilament as e:
+            return _error(409, str(e))
+        self.cache.invalidate()
+        return _json({"created": count}, status=201)
+
+    async def process(self, request):
+        try:
+            job_id = int(request.match_info["job_id"])
+            payload = await request.json()
+            action = payload["action"]
+            partial_time = float(payload.get("partial_time", 0.0))
+            partial_layer = int(payload.get("partial_layer", 0))
+        except (ValueError, KeyError, TypeError):
+            return _error(400, "Se requiere action")
+        if action not in ACTIONS:
+            return _error(400, f"action debe ser uno de {', '.join(ACTIONS)}")
+
+        def work():
+            with self.Session() as s:
+                job = with_retry(s, process_job_by_id, job_id, action, partial_time, partial_layer)
+                if action == "deleted":
+                    return dict(id=job_id, status="deleted")
+                return _job_dict(job)
+
+        try:
+            job = await self._db(work)
+        except LookupError:
+            return _error(404, "Trabajo no encontrado")
+        except (ValueError, ConcurrentUpdate) as e:
+            return _error(409, str(e))
+        self.cache.invalidate()
+        return _json(job)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get("/objects", self.list_objects),
+            web.get("/filaments", self.list_filaments),
+            web.get("/printers", self.list_printers),
+            web.get("/jobs", self.list_jobs),
+            web.post("/jobs", self.create_job),
+            web.post("/jobs/bulk", self.create_jobs),
+            web.post("/jobs/{job_id}/process", self.process),
+            web.get("/quotes", self.quotes),
+        ])
+        app.on_cleanup.append(self._cleanup)
+        return app
+
+    async def _cleanup(self, _app):
+        self.executor.shutdown(wait=False)
+        self.engine.dispose()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="API HTTP del gestor de impresión 3D")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(ApiServer(args.database_url).app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import sys
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, insert, update, delete, union_all, literal, null
+
+from database import SessionLocal
+from models import PrintJob, PrintJobArchive, JobRollup, GlobalConfig
+
+# Archivado de trabajos terminados: los `done`/`cancelled` mas antiguos que
+# `GlobalConfig.archive_after_days` se mueven por lotes a print_jobs_archive
+# y se resumen por dia en job_rollups, para que print_jobs solo tenga la cola
+# activa y el historial reciente.
+#
+#   python -m services.archive [dias]
+
+log = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("done", "cancelled")
+DEFAULT_ARCHIVE_DAYS = 90
+BATCH_SIZE = 1000
+
+_COLUMNS = (
+    "id", "object_id", "filament_id", "printer_id", "quantity",
+    "hours", "filament_used_g", "status", "created_at", "completed_at",
+    "planned_start", "planned_end", "started_at",
+)
+
+
+def archive_after_days(session) -> int:
+    config = session.query(GlobalConfig).first()
+    if config is None or config.archive_after_days is None:
+        return DEFAULT_ARCHIVE_DAYS
+    return config.archive_after_days
+
+
+def _rollup(session, rows: list):
+    groups = {}
+    for row in rows:
+        day = (row.completed_at or row.created_at or datetime.utcnow()).date()
+        key = (day, row.object_id, row.filament_id, row.printer_id, row.status)
+        acc = groups.setdefault(key, [0, 0, 0.0, 0])
+        acc[0] += 1
+        acc[1] += row.quantity or 0
+        acc[2] += row.hours or 0.0
+        acc[3] += row.filament_used_g or 0
+
+    t = JobRollup.__table__
+    for (day, object_id, filament_id, printer_id, status), (jobs, quantity, hours, grams) in groups.items():
+        key = dict(day=day, object_id=object_id, filament_id=filament_id, printer_id=printer_id, status=status)
+        result = session.execute(
+            update(t)
+            .where(t.c.day == day, t.c.object_id == object_id, t.c.filament_id == filament_id,
+                   t.c.printer_id == printer_id, t.c.status == status)
+            .values(jobs=t.c.jobs + jobs, quantity=t.c.quantity + quantity,
+                    hours=t.c.hours + hours, filament_g=t.c.filament_g + grams)
+        )
+        if result.rowcount == 0:
+            session.execute(insert(t).values(**key, jobs=jobs, quantity=quantity, hours=hours, filament_g=grams))
+
+
+def archive_batch(session, cutoff: datetime, batch_size: int = BATCH_SIZE) -> int:
+    jobs = PrintJob.__table__
+    cols = [jobs.c[name] for name in _COLUMNS]
+    rows = session.execute(
+        select(*cols)
+        .where(jobs.c.status.in_(FINISHED_STATUSES), jobs.c.completed_at < cutoff)
+        .order_by(jobs.c.completed_at)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    session.execute(
+        insert(PrintJobArchive.__table__),
+        [dict(row._mapping, archived_at=now) for row in rows],
+    )
+    _rollup(session, rows)
+    session.execute(delete(jobs).where(jobs.c.id.in_([row.id for row in rows])))
+    return len(rows)
+
+
+def archive_finished_jobs(days: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                          session_factory=SessionLocal, stop: Optional[threading.Event] = None) -> int:
+    # una transaccion por lote para no bloquear la cola mientras se archiva
+    total = 0
+    with session_factory() as session:
+        if days is None:
+            days = archive_after_days(session)
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        while stop is None or not stop.is_set():
+            moved = archive_batch(session, cutoff, batch_size)
+            session.commit()
+            total += moved
+            if moved < batch_size:
+                break
+    return total
+
+
+class ArchiveWorker(threading.Thread):
+    def __init__(self, interval_s: float = 6 * 3600, session_factory=SessionLocal):
+        super().__init__(name="archive-worker", daemon=True)
+        self.interval_s = interval_s
+        self.session_factory = session_factory
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                moved = archive_finished_jobs(session_factory=self.session_factory, stop=self._stop_event)
+                if moved:
+                    log.info("%d trabajos archivados", moved)
+            except Exception:
+                log.exception("Error archivando trabajos")
+            self._stop_event.wait(self.interval_s)
+
+
+def job_history():
+    # print_jobs + print_jobs_archive como una sola tabla de solo lectura;
+    # `archived` distingue el origen de cada fila.
+    jobs = PrintJob.__table__
+    archive = PrintJobArchive.__table__
+    return union_all(
+        select(*[jobs.c[name] for name in _COLUMNS], literal(False).label("archived"), null().label("archived_at")),
+        select(*[archive.c[name] for name in _COLUMNS], literal(True).label("archived"), archive.c.archived_at),
+    ).subquery("job_history")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    logging.basicConfig(level=logging.INFO)
+    days = int(argv[0]) if argv else None
+    print(f"{archive_finished_jobs(days)} trabajos archivados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import io
+import gzip
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional, gzip siempre esta disponible
+    zstandard = None
+
+from sqlalchemy import func, or_
+
+from models import Asset, Object3D
+
+# Almacen de archivos STL/G-code direccionado por contenido: cada archivo se
+# guarda una sola vez bajo su sha256 (assets/ab/abcdef...[.zst|.gz]) y los
+# objetos lo referencian por hash.
+
+ASSET_ROOT = os.environ.get("ASSET_ROOT", "assets")
+DEFAULT_COMPRESSION = "zstd" if zstandard else "gzip"
+CHUNK_SIZE = 1024 * 1024
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+_SUFFIXES = {"zstd": ".zst", "gzip": ".gz", None: ""}
+
+
+def hash_file(path: str) -> tuple:
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+
+def hash_files(paths: list, workers: int = MAX_WORKERS) -> dict:
+    # hashlib libera el GIL con bloques grandes, asi que los hilos escalan
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(hash_file, paths)))
+
+
+def blob_path(digest: str, compression: Optional[str] = None, root: str = ASSET_ROOT) -> str:
+    return os.path.join(root, digest[:2], digest + _SUFFIXES[compression])
+
+
+def find_blob(digest: str, root: str = ASSET_ROOT) -> tuple:
+    for compression in _SUFFIXES:
+        path = blob_path(digest, compression, root)
+        if os.path.exists(path):
+            return path, compression
+    raise FileNotFoundError(f"Asset {digest} no encontrado en {root}")
+
+
+def _write_blob(src: str, digest: str, compression: Optional[str], root: str) -> int:
+    target = blob_path(digest, compression, root)
+    if os.path.exists(target):
+        return os.path.getsize(target)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    try:
+        with open(src, "rb") as fin, os.fdopen(fd, "wb") as fout:
+            if compression == "zstd":
+                with zstandard.ZstdCompressor(level=10).stream_writer(fout, closefd=False) as writer:
+                    shutil.copyfileobj(fin, writer, CHUNK_SIZE)
+            elif compression == "gzip":
+                with gzip.GzipFile(fileobj=fout, mode="wb", compresslevel=6, mtime=0) as writer:
+                    shutil.copyfileobj(fin, writer, CHUNK_SIZE)
+            else:
+                shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return os.path.getsize(target)
+
+
+def put_files(session, paths: list, compression: Optional[str] = DEFAULT_COMPRESSION,
+              root: str = ASSET_ROOT, workers: int = MAX_WORKERS) -> dict:
+    if compression == "zstd" and zstandard is None:
+        compression = "gzip"
+
+    paths = [p for p in dict.fromkeys(paths) if p and os.path.isfile(p)]
+    hashes = hash_files(paths, workers)
+
+    digests = {d for d, _ in hashes.values()}
+    known = {a.hash: a for a in session.query(Asset).filter(Asset.hash.in_(digests))} if digests else {}
+
+    # un solo archivo fuente por contenido nuevo
+    new = {}
+    for path, (digest, size) in hashes.items():
+        if digest not in known and digest not in new:
+            new[digest] = (path, size)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stored = pool.map(lambda d: _write_blob(new[d][0], d, compression, root), list(new))
+        for digest, stored_size in zip(list(new), stored):
+            path, size = new[digest]
+            asset = Asset(
+                hash=digest,
+                size=size,
+                stored_size=stored_size,
+                compression=compression,
+                original_name=os.path.basename(path),
+            )
+            session.add(asset)
+            known[digest] = asset
+
+    return {path: known[digest] for path, (digest, _) in hashes.items()}
+
+
+def put_file(session, path: str, compression: Optional[str] = DEFAULT_COMPRESSION, root: str = ASSET_ROOT) -> Optional[Asset]:
+    return put_files(session, [path], compression, root).get(path)
+
+
+def open_asset(digest: str, root: str = ASSET_ROOT):
+    # lectura en streaming, sin descomprimir a un archivo temporal
+    path, compression = find_blob(digest, root)
+    fh = open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            fh.close()
+            raise RuntimeError("Se requiere el paquete 'zstandard' para leer este asset")
+        reader = zstandard.ZstdDecompressor().stream_reader(fh, read_size=CHUNK_SIZE, closefd=True)
+        return io.BufferedReader(reader, CHUNK_SIZE)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fh, mode="rb")
+    return fh
+
+
+def open_asset_text(digest: str, root: str = ASSET_ROOT, encoding: str = "utf-8"):
+    return io.TextIOWrapper(open_asset(digest, root), encoding=encoding, errors="ignore")
+
+
+def attach_object_files(session, obj: Object3D, compression: Optional[str] = DEFAULT_COMPRESSION, root: str = ASSET_ROOT):
+    # una ruta vacia o ilegible deja el objeto sin asset: no debe seguir
+    # apuntando al contenido de la ruta anterior
+    assets = put_files(session, [obj.stl_path, obj.gcode_path], compression, root)
+    stl, gcode = assets.get(obj.stl_path), assets.get(obj.gcode_path)
+    obj.stl_hash = stl.hash if stl else None
+    obj.gcode_hash = gcode.hash if gcode else None
+
+
+def duplicates_of(session, obj: Object3D) -> list:
+    criteria = []
+    if obj.stl_hash:
+        criteria.append(Object3D.stl_hash == obj.stl_hash)
+    if obj.gcode_hash:
+        criteria.append(Object3D.gcode_hash == obj.gcode_hash)
+    if not criteria:
+        return []
+    q = session.query(Object3D).filter(or_(*criteria))
+    if obj.id is not None:
+        q = q.filter(Object3D.id != obj.id)
+    return q.all()
+
+
+def duplicate_groups(session) -> dict:
+    # hash -> ids de los objetos que comparten el mismo modelo o G-code
+    groups = {}
+    for column in (Object3D.stl_hash, Object3D.gcode_hash):
+        dupes = (
+            session.query(column)
+            .filter(column.isnot(None))
+            .group_by(column)
+            .having(func.count(Object3D.id) > 1)
+            .subquery()
+        )
+        for digest, obj_id in session.query(column, Object3D.id).filter(column.in_(dupes.select())):
+            groups.setdefault(digest, []).append(obj_id)
+    return groups
+
+
+def usage(session) -> tuple:
+    size, stored = session.query(func.coalesce(func.sum(Asset.size), 0), func.coalesce(func.sum(Asset.stored_size), 0)).one()
+    return int(size), int(stored)
@@ -0,0 +1,212 @@
+import io
+import re
+import csv
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import insert
+
+from database import SessionLocal
+from models import Object3D, Filament, Printer, PrintJob
+from services.queue_ops import next_slot
+from services.reservations import reserve, InsufficientFilament
+
+# Carga de pedidos completos en la cola: valida todas las lineas, reserva el
+# filamento con un UPDATE por rollo (sumando las lineas que lo usan) e inserta
+# todos los trabajos con un solo INSERT, en una transaccion.
+#
+#   python -m services.bulk_enqueue pedido.csv
+#
+# CSV con cabecera objeto, filamento, impresora, cantidad (o object_id,
+# filament_id, printer_id, quantity); cada referencia puede ser id, nombre o
+# "nombre #id" (la etiqueta de los selectores cuando el nombre se repite).
+
+_LABEL_ID = re.compile(r".*\s#(\d+)$")
+
+HEADERS = {
+    "objeto": "object", "object": "object", "object_id": "object",
+    "filamento": "filament", "filament": "filament", "filament_id": "filament",
+    "impresora": "printer", "printer": "printer", "printer_id": "printer",
+    "cantidad": "quantity", "quantity": "quantity",
+}
+
+
+class OrderError(ValueError):
+    def __init__(self, errors: list):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+@dataclass
+class OrderLine:
+    object_id: int
+    filament_id: int
+    printer_id: int
+    quantity: int = 1
+    line: int = 0
+
+
+def read_order_csv(fh) -> list:
+    # devuelve filas {"object", "filament", "printer", "quantity", "line"} sin resolver
+    text = fh.read() if hasattr(fh, "read") else fh
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+
+    header = next(reader, None)
+    if header is None:
+        raise OrderError(["El archivo está vacío"])
+    columns = [HEADERS.get(h.strip().lower()) for h in header]
+    missing = {"object", "filament", "printer"} - set(columns)
+    if missing:
+        raise OrderError([f"Faltan columnas: {', '.join(sorted(missing))}"])
+
+    rows = []
+    for number, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        row = {key: v.strip() for key, v in zip(columns, values) if key}
+        row["line"] = number
+        rows.append(row)
+    return rows
+
+
+def _ref_id(ref: str) -> Optional[int]:
+    if ref.isdigit():
+        return int(ref)
+    match = _LABEL_ID.match(ref)
+    return int(match.group(1)) if match else None
+
+
+def _lookup(session, model, refs: set) -> tuple:
+    # referencias -> id, y nombres que corresponden a varias filas
+    ids = {_ref_id(r) for r in refs} - {None}
+    names = {r for r in refs if _ref_id(r) is None}
+    found, ambiguous = {}, set()
+    if ids:
+        existing = {i for (i,) in session.query(model.id).filter(model.id.in_(ids))}
+        found.update({r: _ref_id(r) for r in refs if _ref_id(r) in existing})
+    if names:
+        for i, name in session.query(model.id, model.name).filter(model.name.in_(names)):
+            if name in found:
+                ambiguous.add(name)
+            found[name] = i
+    for name in ambiguous:
+        del found[name]
+    return found, ambiguous
+
+
+def resolve_lines(session, rows: list) -> list:
+    labels = (("object", Object3D, "objeto"), ("filament", Filament, "filamento"), ("printer", Printer, "impresora"))
+    maps = {key: _lookup(session, model, {r.get(key, "") for r in rows}) for key, model, _ in labels}
+
+    lines, errors = [], []
+    for row in rows:
+        problems = []
+        ids = {}
+        for key, _model, label in labels:
+            ref = row.get(key, "")
+            found, ambiguous = maps[key]
+            ids[key] = found.get(ref)
+            if ref in ambiguous:
+                problems.append(f"{label} '{ref}' es ambiguo, usar el id o '{ref} #id'")
+            elif ids[key] is None:
+                problems.append(f"{label} '{ref}' no existe")
+        try:
+            quantity = int(row.get("quantity") or 1)
+            if quantity < 1:
+                raise ValueError
+        except ValueError:
+            problems.append(f"cantidad '{row.get('quantity')}' no válida")
+            quantity = 0
+        if problems:
+            errors.append(f"línea {row['line']}: {'; '.join(problems)}")
+        else:
+            lines.append(OrderLine(ids["object"], ids["filament"], ids["printer"], quantity, row["line"]))
+
+    if errors:
+        raise OrderError(errors)
+    return lines
+
+
+def enqueue_many(session, lines: Iterable[OrderLine], at: Optional[datetime] = None) -> int:
+    lines = list(lines)
+    if not lines:
+        return 0
+    at = at or datetime.utcnow()
+
+    objects = {
+        o.id: o for o in session.query(Object3D.id, Object3D.weight_grams, Object3D.print_time_hours)
+        .filter(Object3D.id.in_({item.object_id for item in lines}))
+    }
+    spools = {
+        f.id: f for f in session.query(Filament.id, Filament.name, Filament.remaining_g_projected)
+        .filter(Filament.id.in_({item.filament_id for item in lines}))
+    }
+    printers = {pid for (pid,) in session.query(Printer.id).filter(Printer.id.in_({item.printer_id for item in lines}))}
+
+    errors = []
+    for item in lines:
+        if item.object_id not in objects or item.filament_id not in spools or item.printer_id not in printers or item.quantity < 1:
+            errors.append(f"línea {item.line}: objeto, filamento, impresora o cantidad no válidos")
+    if errors:
+        raise OrderError(errors)
+
+    needed = {}
+    for item in lines:
+        needed[item.filament_id] = needed.get(item.filament_id, 0) + objects[item.object_id].weight_grams * item.quantity
+    short = [
+        f"{spools[fid].name}: faltan {grams - (spools[fid].remaining_g_projected or 0)} g"
+        for fid, grams in needed.items() if grams > (spools[fid].remaining_g_projected or 0)
+    ]
+    if short:
+        raise InsufficientFilament("Filamento insuficiente para el pedido:\n" + "\n".join(short))
+
+    # un UPDATE atomico por rollo; si otro proceso reservo entretanto, falla aqui
+    for fid, grams in sorted(needed.items()):
+        reserve(session, fid, grams)
+
+    cursors = {pid: next_slot(session, pid, at) for pid in printers}
+    rows = []
+    for item in lines:
+        obj = objects[item.object_id]
+        hours = obj.print_time_hours * item.quantity
+        start = cursors[item.printer_id]
+        end = start + timedelta(hours=hours)
+        cursors[item.printer_id] = end
+        rows.append(dict(
+            object_id=item.object_id, filament_id=item.filament_id, printer_id=item.printer_id,
+            quantity=item.quantity, hours=hours, filament_used_g=obj.weight_grams * item.quantity,
+            status="pending", created_at=at, completed_at=at, planned_start=start, planned_end=end,
+        ))
+    session.execute(insert(PrintJob.__table__), rows)
+    return len(rows)
+
+
+def import_order_csv(session, fh) -> int:
+    return enqueue_many(session, resolve_lines(session, read_order_csv(fh)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Uso: python -m services.bulk_enqueue PEDIDO.csv")
+        return 2
+    with SessionLocal() as session, open(argv[0], encoding="utf-8-sig", newline="") as fh:
+        try:
+            count = import_order_csv(session, fh)
+            session.commit()
+        except (OrderError, InsufficientFilament) as e:
+            session.rollback()
+            print(e)
+            return 1
+    print(f"{count} trabajos agregados a la cola")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
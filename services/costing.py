@@ -0,0 +1,33 @@
+from models import GlobalConfig, Filament, Printer
+
+def get_cost_parameters_and_profit_margin(session):
+    config = session.query(GlobalConfig).first()
+    if not config:
+        config = GlobalConfig()
+        session.add(config)
+        session.commit()
+
+    if config.use_manual:
+        return (
+            config.manual_filament_cost or 0,
+            config.manual_energy_cost or 0,
+            config.manual_printer_cost or 0,
+            config.manual_profit_margin or 0
+        )
+
+    filaments = session.query(Filament).all()
+    printers = session.query(Printer).all()
+
+    costo_gramo = sum(f.price/f.initial_g for f in filaments)/len(filaments) if filaments else 0
+    costo_kwh = (sum(p.power_kwh_per_hour for p in printers)/len(printers))*config.electricity_cost_kwh if printers else config.electricity_cost_kwh
+    costo_desgaste = sum(p.wear_per_hour for p in printers)/len(printers) if printers else 0
+
+    return (costo_gramo, costo_kwh, costo_desgaste, config.profit_margin)
+
+
+def compute_cost(weight_grams, print_time_hours, objects, params) -> tuple:
+    costo_gramo, costo_kwh, costo_desgaste, profit_margin = params
+    q = objects or 1
+    cost = int((weight_grams * costo_gramo + print_time_hours * costo_kwh + print_time_hours * costo_desgaste) / q)
+    suggested_price = int(cost * ((profit_margin / 100.0) + 1))
+    return cost, suggested_price
@@ -0,0 +1,189 @@
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+
+import aiohttp
+from aiohttp import web
+from sqlalchemy.orm import sessionmaker
+
+from database import create_db_engine
+
+# Impresora Moonraker simulada para probar el poller sin hardware. Responde a
+# /printer/objects/query siguiendo un guion de estados; cada consulta avanza
+# un paso y suma STEP_S segundos de impresion. Como Moonraker, el tiempo
+# vuelve a cero al empezar cada impresion.
+#
+#   python -m services.fake_printer --port 7125 --states printing:3,cancelled
+#   python -m services.fake_printer --check
+#
+# --check levanta la impresora en un puerto libre, la conecta al poller sobre
+# una base temporal y recorre los guiones de SCENARIOS: un trabajo cancelado a
+# mitad, uno de varias copias cancelado en la ultima y uno de varias copias
+# terminado, comprobando estados, horas, filamento y saldos del rollo.
+
+log = logging.getLogger(__name__)
+
+STEP_S = 600.0
+DEFAULT_STATES = "standby,printing:3,cancelled"
+
+# (cantidad, guion, estados esperados, horas, gramos); cada copia es de 1 h y 100 g
+SCENARIOS = [
+    (1, DEFAULT_STATES, ["pending", "printing", "cancelled"], 0.5, 50),
+    (3, "standby,printing:2,complete,printing:2,complete,printing:1,cancelled",
+     ["pending", "printing", "cancelled"], 2 + 1 / 6, 217),
+    (2, "standby,printing:2,complete,printing:2,complete", ["pending", "printing", "done"], 2.0, 200),
+]
+
+
+def parse_states(text: str) -> list:
+    # "printing:3,cancelled" -> ["printing", "printing", "printing", "cancelled"]
+    states = []
+    for part in text.split(","):
+        name, _, count = part.strip().partition(":")
+        states.extend([name] * (int(count) if count else 1))
+    return states
+
+
+class FakeMoonraker:
+    def __init__(self, states: list, step_s: float = STEP_S):
+        self.states = states
+        self.step_s = step_s
+        self.polls = 0
+        self.elapsed_s = 0.0
+        self.last_state = None
+
+    @property
+    def state(self) -> str:
+        # el ultimo estado del guion se mantiene
+        return self.states[min(self.polls, len(self.states) - 1)]
+
+    async def query(self, request):
+        state = self.state
+        if state == "printing":
+            if self.last_state not in ("printing", "paused"):
+                self.elapsed_s = 0.0
+            self.elapsed_s += self.step_s
+        self.last_state = state
+        self.polls += 1
+        if state == "complete":
+            progress = 1.0
+        else:
+            progress = min(self.elapsed_s / (self.step_s * len(self.states)), 1.0)
+        return web.json_response({"result": {"status": {
+            "print_stats": {"state": state, "print_duration": self.elapsed_s},
+            "virtual_sdcard": {"progress": progress},
+        }}})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/printer/objects/query", self.query)
+        return app
+
+
+async def _serve(printer: FakeMoonraker, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(printer.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def _scenario(quantity: int, states: str) -> tuple:
+    from models import Object3D, Filament, Printer, PrintJob
+    from services.migrations import migrate
+    from services.queue_ops import enqueue_job
+    from services.printer_poller import PrinterPoller, load_targets
+
+    printer = FakeMoonraker(parse_states(states))
+    runner = await _serve(printer, "127.0.0.1", 0)
+    host, port = runner.addresses[0][:2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'check.db')}")
+        migrate(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as s:
+            obj = Object3D(name="Prueba", stl_path="", gcode_path="", objects=1, weight_grams=100,
+                           print_time_hours=1.0, cost=0, suggested_price=0)
+            spool = Filament(name="PLA", price=1, initial_g=1000, remaining_g_effective=1000, remaining_g_projected=1000)
+            machine = Printer(name="Moonraker", price=1, wear_per_hour=0, power_kwh_per_hour=0,
+                              api_type="moonraker", api_url=f"http://{host}:{port}")
+            s.add_all([obj, spool, machine])
+            s.commit()
+            job = enqueue_job(s, obj, spool, machine, quantity)
+            s.commit()
+            job_id, spool_id = job.id, spool.id
+
+        poller = PrinterPoller(load_targets(Session), Session)
+        seen = []
+        async with aiohttp.ClientSession() as http:
+            for _ in printer.states:
+                await poller.poll_once(http, poller.targets[0])
+                await poller._flush()
+                with Session() as s:
+                    status = s.get(PrintJob, job_id).status
+                if not seen or seen[-1] != status:
+                    seen.append(status)
+
+        with Session() as s:
+            job = s.get(PrintJob, job_id)
+            spool = s.get(Filament, spool_id)
+            result = seen, job.hours, job.filament_used_g, (spool.remaining_g_effective, spool.remaining_g_projected)
+        engine.dispose()
+    await runner.cleanup()
+    return result
+
+
+async def check() -> int:
+    failed = 0
+    for quantity, states, expected_seen, expected_h, expected_g in SCENARIOS:
+        seen, hours, used, balances = await _scenario(quantity, states)
+        problems = []
+        if seen != expected_seen:
+            problems.append(f"estados {seen}")
+        if abs(hours - expected_h) > 1e-6:
+            problems.append(f"horas {hours} != {expected_h}")
+        if used != expected_g:
+            problems.append(f"filamento usado {used} g != {expected_g} g")
+        if balances != (1000 - used, 1000 - used):
+            problems.append(f"saldos del rollo {balances}")
+
+        print(f"{quantity} copia(s) [{states}]: {' -> '.join(seen)}; {hours:.2f} h, {used} g")
+        for problem in problems:
+            print(f"ERROR: {problem}")
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+async def serve(states: list, host: str, port: int):
+    runner = await _serve(FakeMoonraker(states), host, port)
+    log.info("Moonraker simulado en http://%s:%d", host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Impresora Moonraker simulada")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7125)
+    parser.add_argument("--states", default=DEFAULT_STATES)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.check:
+        return asyncio.run(check())
+    try:
+        asyncio.run(serve(parse_states(args.states), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, func
+
+from models import Filament
+from services.archive import FINISHED_STATUSES, job_history
+
+# Pronostico de consumo de filamento por material/color.
+#
+# Serie diaria de gramos consumidos (trabajos terminados o cancelados, activos
+# y archivados) suavizada exponencialmente; todas las series se actualizan a la
+# vez como vectores. Solo se incorporan dias completos: el estado se avanza de
+# forma incremental hasta ayer y cada consulta lee solo los trabajos nuevos.
+
+ALPHA = 0.1
+LEAD_TIME_DAYS = 7
+SERVICE_Z = 1.65  # ~95% de nivel de servicio
+FOLD_BLOCK = 128  # dias por bloque al incorporar historial
+
+
+@dataclass
+class SpoolForecast:
+    daily_g: float
+    runout: Optional[date]
+    reorder_point_g: float
+    reorder_now: bool
+
+
+def _as_date(value) -> date:
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _key(material, color) -> tuple:
+    return ((material or "").strip().lower(), (color or "").strip().lower())
+
+
+class ConsumptionForecast:
+    def __init__(self, alpha: float = ALPHA, lead_time_days: int = LEAD_TIME_DAYS, service_z: float = SERVICE_Z):
+        self.alpha = alpha
+        self.lead_time_days = lead_time_days
+        self.service_z = service_z
+        self.index = {}                       # (material, color) -> fila
+        self.level = np.zeros(0)              # g/dia suavizado
+        self.var = np.zeros(0)                # varianza suavizada
+        self.as_of = None                     # ultimo dia incorporado
+
+    def _daily_totals(self, session, since: Optional[date], until: date):
+        history = job_history()
+        day = func.date(history.c.completed_at)
+        stmt = (
+            select(Filament.material, Filament.color, day, func.sum(history.c.filament_used_g))
+            .join(Filament, Filament.id == history.c.filament_id)
+            .where(history.c.status.in_(FINISHED_STATUSES), history.c.completed_at < datetime.combine(until, datetime.min.time()))
+            .group_by(Filament.material, Filament.color, day)
+        )
+        if since is not None:
+            stmt = stmt.where(history.c.completed_at >= datetime.combine(since, datetime.min.time()))
+        return [(_key(m, c), _as_date(d), g or 0) for m, c, d, g in session.execute(stmt)]
+
+    def _grow(self, keys):
+        for key in keys:
+            if key not in self.index:
+                self.index[key] = len(self.index)
+        n = len(self.index)
+        if n > len(self.level):
+            self.level = np.concatenate([self.level, np.zeros(n - len(self.level))])
+            self.var = np.concatenate([self.var, np.zeros(n - len(self.var))])
+
+    def _fold(self, totals, start: date, end: date):
+        # incorpora los dias [start, end] en bloque: X (series x dias), sin
+        # recorrer serie por serie
+        days = (end - start).days + 1
+        if days <= 0:
+            return
+        self._grow(k for k, _, _ in totals)
+        X = np.zeros((len(self.index), days))
+        for key, d, grams in totals:
+            X[self.index[key], (d - start).days] += grams
+        for lo in range(0, days, FOLD_BLOCK):
+            self._fold_block(X[:, lo:lo + FOLD_BLOCK])
+
+    def _fold_block(self, X):
+        # equivale a avanzar dia a dia
+        #   level_t = (1-a) level_{t-1} + a x_t
+        #   var_t   = (1-a) var_{t-1} + a (x_t - level_t)^2
+        # con el nivel de cada dia: level_t = (1-a)^(t+1) (level_0 + sum_s a x_s (1-a)^-(s+1)).
+        # Los bloques son cortos para que (1-a)^-t no pierda precision.
+        a = self.alpha
+        days = X.shape[1]
+        t = np.arange(days)
+        growth = (1 - a) ** -(t + 1.0)
+        levels = (self.level[:, None] + a * np.cumsum(X * growth, axis=1)) / growth
+        weights = a * (1 - a) ** (days - 1 - t)
+        self.var = (1 - a) ** days * self.var + ((X - levels) ** 2) @ weights
+        self.level = levels[:, -1]
+
+    def update(self, session, today: Optional[date] = None):
+        today = today or datetime.utcnow().date()
+        yesterday = today - timedelta(days=1)
+
+        if self.as_of is None:
+            totals = self._daily_totals(session, None, today)
+            if not totals:
+                self.as_of = yesterday
+                return
+            start = min(d for _, d, _ in totals)
+            self._fold(totals, start, yesterday)
+        elif self.as_of < yesterday:
+            start = self.as_of + timedelta(days=1)
+            self._fold(self._daily_totals(session, start, today), start, yesterday)
+        self.as_of = max(self.as_of or yesterday, yesterday)
+
+    def forecast(self, session, filaments: list, today: Optional[date] = None) -> dict:
+        today = today or datetime.utcnow().date()
+        self.update(session, today)
+        if not filaments:
+            return {}
+
+        keys = [_key(f.material, f.color) for f in filaments]
+        self._grow(keys)
+        rows = np.array([self.index[k] for k in keys])
+        remaining = np.array([f.remaining_g_projected or 0 for f in filaments], dtype=np.float64)
+
+        # los rollos del mismo material/color comparten el consumo
+        group_remaining = np.zeros(len(self.index))
+        np.add.at(group_remaining, rows, remaining)
+
+        rate = self.level[rows]
+        sd = np.sqrt(self.var[rows])
+        lead = self.lead_time_days
+        reorder_point = rate * lead + self.service_z * sd * math.sqrt(lead)
+        stock = group_remaining[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_left = np.where(rate > 0, stock / rate, np.inf)
+
+        result = {}
+        for f, r, d, rp, s in zip(filaments, rate, days_left, reorder_point, stock):
+            runout = None
+            if np.isfinite(d):
+                runout = today + timedelta(days=max(int(d), 0))
+            result[f.id] = SpoolForecast(float(r), runout, float(rp), bool(r > 0 and s <= rp))
+        return result
@@ -0,0 +1,299 @@
+import os
+import re
+import math
+import struct
+from array import array
+from bisect import bisect_right
+from typing import Optional
+
+from services.asset_store import find_blob, open_asset
+
+# Indice compacto por archivo G-code: en cada cambio de capa guarda el offset
+# en bytes, el tiempo acumulado (s) y la extrusion acumulada (mm de filamento).
+# Se guarda como sidecar "<archivo>.idx" y se reconstruye solo si el G-code cambia.
+
+INDEX_SUFFIX = ".idx"
+_MAGIC = b"GCIX"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHqqI")  # magic, version, size, mtime_ns, entradas
+
+_WORD = re.compile(r"([GMXYZEFPST])(-?\d*\.?\d+)")
+_LAYER_MARKERS = (";LAYER_CHANGE", ";LAYER:")
+_TIME_ELAPSED = ";TIME_ELAPSED:"
+
+_cache = {}
+
+
+class GcodeIndex:
+    __slots__ = ("offsets", "times", "extrusion")
+
+    def __init__(self, offsets: array, times: array, extrusion: array):
+        self.offsets = offsets
+        self.times = times
+        self.extrusion = extrusion
+
+    @property
+    def layer_count(self) -> int:
+        return max(len(self.times) - 1, 0)
+
+    @property
+    def total_time(self) -> float:
+        return self.times[-1] if self.times else 0.0
+
+    @property
+    def total_extrusion(self) -> float:
+        return self.extrusion[-1] if self.extrusion else 0.0
+
+    def extrusion_at_time(self, seconds: float) -> float:
+        times = self.times
+        if not times or seconds <= 0:
+            return 0.0
+        if seconds >= times[-1]:
+            return self.extrusion[-1]
+        if seconds < times[0]:
+            return self.extrusion[0] * seconds / times[0]
+        i = bisect_right(times, seconds) - 1
+        t0, t1 = times[i], times[i + 1]
+        e0, e1 = self.extrusion[i], self.extrusion[i + 1]
+        if t1 <= t0:
+            return e1
+        return e0 + (e1 - e0) * (seconds - t0) / (t1 - t0)
+
+    def extrusion_at_layer(self, layer: int) -> float:
+        # extrusion al terminar `layer` capas completas
+        if not self.extrusion or layer <= 0:
+            return 0.0
+        return self.extrusion[min(layer, len(self.extrusion) - 1)]
+
+    def time_at_layer(self, layer: int) -> float:
+        # segundos al terminar `layer` capas completas
+        if not self.times or layer <= 0:
+            return 0.0
+        return self.times[min(layer, len(self.times) - 1)]
+
+    def offset_at_layer(self, layer: int) -> int:
+        return self.offsets[min(max(layer, 0), len(self.offsets) - 1)]
+
+    def fraction_at_time(self, fraction: float) -> float:
+        if self.total_extrusion <= 0:
+            return min(max(fraction, 0.0), 1.0)
+        return self.extrusion_at_time(fraction * self.total_time) / self.total_extrusion
+
+    def fraction_at_layer(self, layer: int) -> float:
+        if self.total_extrusion <= 0:
+            return min(layer / self.layer_count, 1.0) if self.layer_count else 0.0
+        return self.extrusion_at_layer(layer) / self.total_extrusion
+
+
+def parse_index(fh) -> GcodeIndex:
+    marker_entries = ([], [], [])
+    z_entries = ([], [], [])
+
+    pos = {"X": 0.0, "Y": 0.0, "Z": 0.0, "E": 0.0}
+    feedrate = 1500.0  # mm/min
+    relative_xyz = False
+    relative_e = False
+    elapsed = 0.0
+    extruded = 0.0
+    last_z = None
+    offset = 0
+
+    def record(entries, at):
+        entries[0].append(at)
+        entries[1].append(elapsed)
+        entries[2].append(extruded)
+
+    for raw in fh:
+        line_offset = offset
+        offset += len(raw)
+        line = raw.decode("ascii", "ignore").strip()
+        if not line:
+            continue
+
+        if line[0] == ";":
+            if line.startswith(_LAYER_MARKERS):
+                record(marker_entries, line_offset)
+            elif line.startswith(_TIME_ELAPSED):
+                try:
+                    elapsed = max(elapsed, float(line[len(_TIME_ELAPSED):]))
+                except ValueError:
+                    pass
+            continue
+
+        code = line.split(";", 1)[0].upper()
+        words = dict(_WORD.findall(code))
+        if "G" in words:
+            g = words["G"]
+            if g in ("0", "1", "00", "01"):
+                if "F" in words:
+                    feedrate = float(words["F"]) or feedrate
+                delta = {}
+                for axis in "XYZ":
+                    if axis in words:
+                        value = float(words[axis])
+                        target = pos[axis] + value if relative_xyz else value
+                        delta[axis] = target - pos[axis]
+                        pos[axis] = target
+                de = 0.0
+                if "E" in words:
+                    value = float(words["E"])
+                    de = value if relative_e else value - pos["E"]
+                    pos["E"] = pos["E"] + value if relative_e else value
+                    extruded += de
+                dist = math.sqrt(sum(d * d for d in delta.values())) or abs(de)
+                if dist and feedrate > 0:
+                    elapsed += dist / (feedrate / 60.0)
+                if delta.get("Z", 0) > 0 and (last_z is None or pos["Z"] > last_z):
+                    last_z = pos["Z"]
+                    record(z_entries, line_offset)
+            elif g == "4":
+                if "P" in words:
+                    elapsed += float(words["P"]) / 1000.0
+                elif "S" in words:
+                    elapsed += float(words["S"])
+            elif g == "90":
+                relative_xyz = relative_e = False
+            elif g == "91":
+                relative_xyz = relative_e = True
+            elif g == "92":
+                for axis in "XYZE":
+                    if axis in words:
+                        pos[axis] = float(words[axis])
+        elif "M" in words:
+            if words["M"] == "82":
+                relative_e = False
+            elif words["M"] == "83":
+                relative_e = True
+
+    entries = marker_entries if marker_entries[0] else z_entries
+    record(entries, offset)
+
+    return GcodeIndex(array("q", entries[0]), array("d", entries[1]), array("d", entries[2]))
+
+
+def _sidecar_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def _read_sidecar(path: str, st: os.stat_result) -> Optional[GcodeIndex]:
+    try:
+        with open(_sidecar_path(path), "rb") as fh:
+            header = fh.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                return None
+            magic, version, size, mtime_ns, count = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION or size != st.st_size or mtime_ns != st.st_mtime_ns:
+                return None
+            offsets, times, extrusion = array("q"), array("d"), array("d")
+            offsets.fromfile(fh, count)
+            times.fromfile(fh, count)
+            extrusion.fromfile(fh, count)
+    except (OSError, EOFError):
+        return None
+    return GcodeIndex(offsets, times, extrusion)
+
+
+def _write_sidecar(path: str, st: os.stat_result, index: GcodeIndex):
+    target = _sidecar_path(path)
+    tmp = target + ".tmp"
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(_HEADER.pack(_MAGIC, _VERSION, st.st_size, st.st_mtime_ns, len(index.offsets)))
+            index.offsets.tofile(fh)
+            index.times.tofile(fh)
+            index.extrusion.tofile(fh)
+        os.replace(tmp, target)
+    except OSError:
+        # carpeta de solo lectura: el indice queda solo en memoria
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def build_index(path: str, opener=None) -> GcodeIndex:
+    # `opener` permite leer el contenido desde otra fuente (p. ej. un asset
+    # comprimido) manteniendo el sidecar junto a `path`
+    st = os.stat(path)
+    with (opener() if opener else open(path, "rb")) as fh:
+        index = parse_index(fh)
+    _write_sidecar(path, st, index)
+    _cache[path] = (st.st_size, st.st_mtime_ns, index)
+    return index
+
+
+def load_index(path: Optional[str], opener=None) -> Optional[GcodeIndex]:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    cached = _cache.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+
+    index = _read_sidecar(path, st)
+    if index is None:
+        return build_index(path, opener)
+    _cache[path] = (st.st_size, st.st_mtime_ns, index)
+    return index
+
+
+def load_asset_index(digest: Optional[str]) -> Optional[GcodeIndex]:
+    if not digest:
+        return None
+    try:
+        path, _ = find_blob(digest)
+    except FileNotFoundError:
+        return None
+    try:
+        return load_index(path, lambda: open_asset(digest))
+    except (RuntimeError, OSError):
+        # blob comprimido sin el paquete para leerlo (zstandard) o ilegible:
+        # se usa la ruta original del G-code, si existe
+        return None
+
+
+def load_object_index(obj) -> Optional[GcodeIndex]:
+    if obj is None:
+        return None
+    return load_asset_index(obj.gcode_hash) or load_index(obj.gcode_path)
+
+
+def partial_usage(job, partial_time: float, layer: int = 0) -> tuple:
+    # (horas, gramos) consumidos por un trabajo cancelado tras `partial_time`
+    # horas o tras `layer` capas completas de la copia en curso. Cada unidad
+    # de `quantity` es una impresion completa del G-code.
+    quantity = job.quantity or 1
+    per_copy_g = job.filament_used_g / quantity
+    per_copy_h = job.hours / quantity if job.hours else 0
+
+    if per_copy_h <= 0:
+        return partial_time, 0.0
+
+    done = min(int(partial_time / per_copy_h), quantity)
+    used = per_copy_g * done
+    if done == quantity:
+        return partial_time, used
+
+    index = load_object_index(job.object)
+    remainder = (partial_time - done * per_copy_h) / per_copy_h
+    hours = partial_time
+
+    if index is None or index.layer_count == 0:
+        fraction = remainder
+    elif layer > 0:
+        fraction = index.fraction_at_layer(layer)
+        if partial_time <= 0:
+            # solo se conoce la capa: el tiempo sale del G-code, escalado a
+            # las horas estimadas del trabajo
+            if index.total_time > 0:
+                hours = per_copy_h * index.time_at_layer(layer) / index.total_time
+            else:
+                hours = per_copy_h * min(layer / index.layer_count, 1.0)
+    else:
+        fraction = index.fraction_at_time(remainder)
+
+    return hours, used + per_copy_g * fraction
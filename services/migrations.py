@@ -0,0 +1,191 @@
+import sys
+from typing import Optional
+
+from sqlalchemy import inspect, text
+
+from database import Base, engine as default_engine
+import models  # noqa: F401  registra las tablas en Base.metadata
+
+# Migraciones versionadas del esquema. `create_all` solo crea tablas nuevas;
+# los cambios sobre tablas existentes (columnas, indices) van aqui.
+#
+#   python -m services.migrations           aplica las pendientes
+#   python -m services.migrations --check   revisa el plan de las consultas frecuentes
+
+
+def _add_column(conn, table: str, name: str):
+    if name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    column = Base.metadata.tables[table].c[name]
+    ddl = column.type.compile(dialect=conn.dialect)
+    if column.server_default is not None:
+        ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+
+def _create_indexes(conn, table: str, names: list):
+    for index in Base.metadata.tables[table].indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _m001_printer_api(conn):
+    for name in ("api_type", "api_url", "api_key"):
+        _add_column(conn, "printers", name)
+
+
+def _m002_object_assets(conn):
+    for name in ("stl_hash", "gcode_hash"):
+        _add_column(conn, "objects", name)
+    _create_indexes(conn, "objects", ["ix_objects_stl_hash", "ix_objects_gcode_hash"])
+
+
+def _m003_print_job_indexes(conn):
+    _create_indexes(conn, "print_jobs", [
+        "ix_print_jobs_status_created_at",
+        "ix_print_jobs_status_completed_at",
+        "ix_print_jobs_filament_id_status",
+        "ix_print_jobs_printer_id_status_created_at",
+        "ix_print_jobs_object_id",
+    ])
+
+
+def _m004_archive_config(conn):
+    _add_column(conn, "global_config", "archive_after_days")
+
+
+def _m005_object_gcode_path_index(conn):
+    _create_indexes(conn, "objects", ["ix_objects_gcode_path"])
+
+
+def _m006_optimistic_locking(conn):
+    _add_column(conn, "filaments", "version")
+    _add_column(conn, "print_jobs", "version")
+
+
+def _m007_job_intervals(conn):
+    for table in ("print_jobs", "print_jobs_archive"):
+        for name in ("planned_start", "planned_end", "started_at"):
+            _add_column(conn, table, name)
+    _create_indexes(conn, "print_jobs", ["ix_print_jobs_printer_id_status_planned_end"])
+
+
+def _m008_reference_versions(conn):
+    # filas iniciales: los flush solo tienen que hacer UPDATE
+    existing = {row[0] for row in conn.execute(text("SELECT kind FROM reference_versions"))}
+    for kind in models.REFERENCE_TABLES:
+        if kind not in existing:
+            conn.execute(text("INSERT INTO reference_versions (kind, version) VALUES (:k, 1)"), {"k": kind})
+
+
+def _m009_print_jobs_autoincrement(conn):
+    # SQLite solo admite AUTOINCREMENT al crear la tabla: se reconstruye
+    # print_jobs y la secuencia arranca despues del mayor id ya usado,
+    # tambien los del archivo
+    if conn.dialect.name != "sqlite":
+        return
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'print_jobs'")).scalar()
+    if "AUTOINCREMENT" not in sql.upper():
+        table = Base.metadata.tables["print_jobs"]
+        columns = ", ".join(c["name"] for c in inspect(conn).get_columns("print_jobs") if c["name"] in table.c)
+        for index in inspect(conn).get_indexes("print_jobs"):
+            conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+        conn.execute(text("ALTER TABLE print_jobs RENAME TO print_jobs_old"))
+        table.create(conn)
+        conn.execute(text(f"INSERT INTO print_jobs ({columns}) SELECT {columns} FROM print_jobs_old"))
+        conn.execute(text("DROP TABLE print_jobs_old"))
+
+    last = conn.execute(text(
+        "SELECT MAX(m) FROM (SELECT MAX(id) AS m FROM print_jobs UNION ALL SELECT MAX(id) FROM print_jobs_archive)"
+    )).scalar() or 0
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'print_jobs'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('print_jobs', :seq)"), {"seq": last})
+
+
+def _m010_printer_status_planned_end_index(conn):
+    # next_slot filtra por estado: con el estado en el indice MAX(planned_end)
+    # no lee los trabajos terminados de la impresora
+    conn.execute(text("DROP INDEX IF EXISTS ix_print_jobs_printer_id_planned_end"))
+    _create_indexes(conn, "print_jobs", ["ix_print_jobs_printer_id_status_planned_end"])
+
+
+def _m011_job_copies_done(conn):
+    _add_column(conn, "print_jobs", "copies_done")
+
+
+MIGRATIONS = [
+    (1, "Conexion API de impresoras", _m001_printer_api),
+    (2, "Referencias a assets en objetos", _m002_object_assets),
+    (3, "Indices de print_jobs", _m003_print_job_indexes),
+    (4, "Antiguedad de archivado", _m004_archive_config),
+    (5, "Indice de objetos por ruta de Gcode", _m005_object_gcode_path_index),
+    (6, "Columnas de version para bloqueo optimista", _m006_optimistic_locking),
+    (7, "Intervalos planificados y reales de trabajos", _m007_job_intervals),
+    (8, "Versiones de los catalogos cacheados", _m008_reference_versions),
+    (9, "Ids de print_jobs sin reutilizar", _m009_print_jobs_autoincrement),
+    (10, "Indice de print_jobs por impresora, estado y fin planificado", _m010_printer_status_planned_end_index),
+    (11, "Copias terminadas por trabajo", _m011_job_copies_done),
+]
+
+
+def current_version(conn) -> int:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def migrate(engine=default_engine, target: Optional[int] = None) -> int:
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        version = current_version(conn)
+        for number, _description, step in MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+            step(conn)
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": number})
+            version = number
+    return version
+
+
+# Consultas frecuentes de la cola y reportes: ninguna deberia recorrer
+# print_jobs completa.
+HOT_QUERIES = {
+    "cola activa": "SELECT id FROM print_jobs WHERE status IN ('pending', 'printing') ORDER BY created_at",
+    "trabajo activo por impresora": "SELECT id FROM print_jobs WHERE printer_id = 1 AND status = 'printing' ORDER BY created_at LIMIT 1",
+    "reservas por filamento": "SELECT SUM(filament_used_g) FROM print_jobs WHERE filament_id = 1 AND status = 'pending'",
+    "fin de turno por impresora": "SELECT MAX(planned_end) FROM print_jobs WHERE printer_id = 1 AND status IN ('pending', 'printing')",
+    "terminados por fecha": "SELECT id FROM print_jobs WHERE status = 'done' AND completed_at >= '2024-01-01'",
+}
+
+
+def query_plan(conn, sql: str) -> list:
+    return [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def full_scans(engine=default_engine) -> dict:
+    if engine.dialect.name != "sqlite":
+        return {}
+    found = {}
+    with engine.connect() as conn:
+        for name, sql in HOT_QUERIES.items():
+            scans = [d for d in query_plan(conn, sql) if d.startswith("SCAN print_jobs") and "USING" not in d]
+            if scans:
+                found[name] = scans
+    return found
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    version = migrate()
+    print(f"Esquema en la version {version}")
+    if "--check" in argv:
+        scans = full_scans()
+        for name, details in scans.items():
+            print(f"{name}: {'; '.join(details)}")
+        return 1 if scans else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
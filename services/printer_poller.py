@@ -0,0 +1,267 @@
+import asyncio
+import random
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import aiohttp
+from sqlalchemy.exc import OperationalError
+
+from database import SessionLocal
+from models import Printer, PrintJob
+from services.queue_ops import process_job
+from services.reservations import RETRIES, ConcurrentUpdate, update_job
+
+# Servicio que consulta las impresoras (OctoPrint / Moonraker) y actualiza
+# el estado de los PrintJob sin intervencion manual.
+#
+#   python -m services.printer_poller
+
+log = logging.getLogger(__name__)
+
+FAST_INTERVAL = 5.0     # s, mientras imprime
+IDLE_INTERVAL = 30.0    # s, impresora libre
+MAX_BACKOFF = 300.0     # s, impresora sin respuesta
+FLUSH_INTERVAL = 2.0    # s, escritura por lotes a la base de datos
+REQUEST_TIMEOUT = 5.0
+
+
+@dataclass
+class RemoteStatus:
+    state: str                      # printing|done|cancelled|idle
+    progress: float = 0.0           # 0..1
+    elapsed_s: float = 0.0
+
+
+@dataclass
+class PrinterTarget:
+    id: int
+    api_type: str
+    api_url: str
+    api_key: Optional[str] = None
+    last_state: Optional[str] = None
+    last_elapsed_s: float = 0.0
+    failures: int = 0
+    interval: float = IDLE_INTERVAL
+
+
+@dataclass
+class StatusUpdate:
+    printer_id: int
+    status: str
+    elapsed_h: float = 0.0
+    at: datetime = field(default_factory=datetime.utcnow)
+
+
+async def fetch_octoprint(http: aiohttp.ClientSession, target: PrinterTarget) -> RemoteStatus:
+    headers = {"X-Api-Key": target.api_key} if target.api_key else {}
+    async with http.get(f"{target.api_url.rstrip('/')}/api/job", headers=headers) as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+
+    state = (data.get("state") or "").lower()
+    progress = data.get("progress") or {}
+    completion = (progress.get("completion") or 0.0) / 100.0
+    elapsed = progress.get("printTime") or 0.0
+
+    if state.startswith(("printing", "pausing", "paused", "resuming", "finishing")):
+        return RemoteStatus("printing", completion, elapsed)
+    if state.startswith("cancelling"):
+        return RemoteStatus("cancelled", completion, elapsed)
+    # OctoPrint vuelve a "Operational" al terminar: se distingue por el avance
+    if target.last_state == "printing":
+        if completion >= 0.999:
+            return RemoteStatus("done", 1.0, elapsed or target.last_elapsed_s)
+        return RemoteStatus("cancelled", completion, elapsed or target.last_elapsed_s)
+    return RemoteStatus("idle", completion, elapsed)
+
+
+async def fetch_moonraker(http: aiohttp.ClientSession, target: PrinterTarget) -> RemoteStatus:
+    headers = {"X-Api-Key": target.api_key} if target.api_key else {}
+    url = f"{target.api_url.rstrip('/')}/printer/objects/query?print_stats&virtual_sdcard"
+    async with http.get(url, headers=headers) as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+
+    status = (data.get("result") or {}).get("status") or {}
+    stats = status.get("print_stats") or {}
+    progress = (status.get("virtual_sdcard") or {}).get("progress") or 0.0
+    state = stats.get("state") or ""
+    elapsed = stats.get("print_duration") or 0.0
+
+    if state in ("printing", "paused"):
+        return RemoteStatus("printing", progress, elapsed)
+    if state == "complete":
+        return RemoteStatus("done", 1.0, elapsed)
+    if state in ("cancelled", "error"):
+        return RemoteStatus("cancelled", progress, elapsed)
+    return RemoteStatus("idle", progress, elapsed)
+
+
+FETCHERS = {
+    "octoprint": fetch_octoprint,
+    "moonraker": fetch_moonraker,
+}
+
+
+def _active_job(session, printer_id: int) -> Optional[PrintJob]:
+    job = (
+        session.query(PrintJob)
+        .filter(PrintJob.printer_id == printer_id, PrintJob.status == "printing")
+        .order_by(PrintJob.created_at)
+        .first()
+    )
+    if job:
+        return job
+    return (
+        session.query(PrintJob)
+        .filter(PrintJob.printer_id == printer_id, PrintJob.status == "pending")
+        .order_by(PrintJob.created_at)
+        .first()
+    )
+
+
+def _apply_update(session, update: StatusUpdate) -> bool:
+    # cada unidad de `quantity` es una impresion completa del G-code: la
+    # impresora informa de cada copia por separado
+    job = _active_job(session, update.printer_id)
+    if job is None:
+        return False
+    if update.status == "printing" and job.status == "printing":
+        return False
+    if update.status in ("done", "cancelled") and job.status != "printing":
+        return False
+
+    quantity = job.quantity or 1
+    if update.status == "done" and job.copies_done + 1 < quantity:
+        # queda en "printing" hasta la ultima copia
+        update_job(session, job, copies_done=job.copies_done + 1)
+        return True
+
+    elapsed_h = update.elapsed_h
+    if update.status == "cancelled":
+        per_copy_h = (job.hours or 0) / quantity
+        elapsed_h += job.copies_done * per_copy_h
+    process_job(session, job, update.status, elapsed_h, at=update.at)
+    return True
+
+
+def write_updates(updates: list, session_factory=SessionLocal) -> int:
+    applied = 0
+    with session_factory() as session:
+        for update in updates:
+            # el cambio de estado falla antes de escribir si otro proceso tomo
+            # el trabajo; se relee y se vuelve a evaluar
+            for _attempt in range(RETRIES):
+                try:
+                    applied += _apply_update(session, update)
+                    break
+                except ConcurrentUpdate:
+                    session.expire_all()
+            else:
+                log.warning("Impresora %s: se descarta el cambio a %s tras %d intentos",
+                            update.printer_id, update.status, RETRIES)
+        session.commit()
+    return applied
+
+
+def load_targets(session_factory=SessionLocal) -> list:
+    with session_factory() as session:
+        printers = (
+            session.query(Printer)
+            .filter(Printer.api_type.in_(list(FETCHERS)), Printer.api_url.isnot(None))
+            .all()
+        )
+        return [PrinterTarget(p.id, p.api_type, p.api_url, p.api_key) for p in printers]
+
+
+class PrinterPoller:
+    def __init__(self, targets: list, session_factory=SessionLocal, max_connections: int = 64):
+        self.targets = targets
+        self.session_factory = session_factory
+        self.max_connections = max_connections
+        self.pending = []
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    async def poll_once(self, http: aiohttp.ClientSession, target: PrinterTarget):
+        remote = await FETCHERS[target.api_type](http, target)
+
+        if remote.state != target.last_state:
+            if remote.state in ("printing", "done", "cancelled"):
+                self.pending.append(StatusUpdate(target.id, remote.state, remote.elapsed_s / 3600.0))
+
+        target.last_state = remote.state
+        target.last_elapsed_s = remote.elapsed_s
+        target.interval = FAST_INTERVAL if remote.state == "printing" else IDLE_INTERVAL
+
+    async def _watch(self, http: aiohttp.ClientSession, target: PrinterTarget):
+        # arranque escalonado para no consultar todas las impresoras a la vez
+        await asyncio.sleep(random.uniform(0, FAST_INTERVAL))
+        while not self._stop.is_set():
+            try:
+                await self.poll_once(http, target)
+                target.failures = 0
+                delay = target.interval
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                target.failures += 1
+                delay = min(FAST_INTERVAL * 2 ** target.failures, MAX_BACKOFF)
+                log.warning("Impresora %s sin respuesta (%s), reintento en %.0fs", target.id, e, delay)
+            delay *= random.uniform(0.9, 1.1)
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush(self):
+        if not self.pending:
+            return
+        updates, self.pending = self.pending, []
+        try:
+            applied = await asyncio.to_thread(write_updates, updates, self.session_factory)
+        except OperationalError as e:
+            # base bloqueada o no disponible: el lote no se escribio, se
+            # reintenta en el proximo flush antes que los cambios nuevos
+            self.pending = updates + self.pending
+            log.warning("No se pudieron guardar %d cambios de estado (%s), se reintentan", len(updates), e.orig)
+            return
+        except Exception:
+            # error no transitorio: se descarta el lote para no repetirlo siempre
+            log.exception("Se descartan %d cambios de estado", len(updates))
+            return
+        log.info("%d cambios de estado aplicados", applied)
+
+    async def _flush_loop(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush()
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+            await asyncio.gather(
+                self._flush_loop(),
+                *(self._watch(http, t) for t in self.targets),
+            )
+        if self.pending:
+            log.warning("%d cambios de estado sin guardar al detener", len(self.pending))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    poller = PrinterPoller(load_targets())
+    try:
+        asyncio.run(poller.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, func
+
+from models import PrintJob
+from services.gcode_index import partial_usage
+from services.reservations import reserve, adjust, update_job, delete_job
+
+# Operaciones de la cola compartidas por la interfaz, el poller y la API.
+# Los saldos de filamento se cambian con UPDATE atomicos (ver
+# services.reservations); el cambio de estado del trabajo se hace primero y
+# falla con ConcurrentUpdate si otro proceso lo modifico, antes de escribir nada.
+
+ACTIONS = ("done", "printing", "cancelled", "deleted")
+ACTIVE_STATUSES = ("pending", "printing")
+
+
+def next_slot(session, printer_id: int, at: Optional[datetime] = None) -> datetime:
+    # fin del ultimo trabajo activo planificado en la impresora (o ahora)
+    at = at or datetime.utcnow()
+    last = session.execute(
+        select(func.max(PrintJob.planned_end))
+        .where(PrintJob.printer_id == printer_id, PrintJob.status.in_(ACTIVE_STATUSES))
+    ).scalar()
+    return max(last, at) if last is not None else at
+
+
+def replan(session, printer_id: int, at: Optional[datetime] = None):
+    # encadena los pendientes detras del trabajo en curso. Las horas planificadas
+    # son orientativas: no cambian `version` para no provocar conflictos.
+    at = at or datetime.utcnow()
+    t = PrintJob.__table__
+    rows = session.execute(
+        select(t.c.id, t.c.status, t.c.hours, t.c.started_at, t.c.planned_start, t.c.planned_end)
+        .where(t.c.printer_id == printer_id, t.c.status.in_(ACTIVE_STATUSES))
+        .order_by((t.c.status != "printing"), t.c.planned_start, t.c.id)
+    ).all()
+
+    cursor = at
+    for job_id, status, hours, started_at, planned_start, planned_end in rows:
+        duration = timedelta(hours=hours or 0)
+        if status == "printing":
+            # si ya va con retraso, termina como pronto ahora
+            start = started_at or planned_start or at
+            end = max(start + duration, at)
+        else:
+            start = cursor
+            end = start + duration
+        cursor = max(cursor, end)
+        if (start, end) != (planned_start, planned_end):
+            session.execute(update(t).where(t.c.id == job_id).values(planned_start=start, planned_end=end))
+
+
+def enqueue_job(session, obj, filament, printer, quantity: int) -> PrintJob:
+    total_hours = obj.print_time_hours * quantity
+    total_filament = obj.weight_grams * quantity
+
+    reserve(session, filament.id, total_filament)
+    start = next_slot(session, printer.id)
+
+    job = PrintJob(
+        # por id: asignar las relaciones marcaria los catalogos como modificados
+        object_id=obj.id,
+        filament_id=filament.id,
+        printer_id=printer.id,
+        quantity=quantity,
+        hours=total_hours,
+        filament_used_g=total_filament,
+        status="pending",
+        planned_start=start,
+        planned_end=start + timedelta(hours=total_hours),
+    )
+    session.add(job)
+    return job
+
+
+def process_job(session, job: PrintJob, action: str, partial_time: float = 0.0, partial_layer: int = 0, at: Optional[datetime] = None):
+    if action not in ACTIONS:
+        raise ValueError(f"Acción desconocida: {action}")
+    if action != "deleted" and job.status not in ACTIVE_STATUSES:
+        raise ValueError(f"El trabajo {job.id} ya fue procesado ({job.status})")
+
+    filament_id = job.filament_id
+    printer_id = job.printer_id
+    reserved = job.filament_used_g
+    at = at or datetime.utcnow()
+
+    if action == "deleted":
+        delete_job(session, job)
+        if job.status in ACTIVE_STATUSES:
+            adjust(session, filament_id, projected=reserved)
+        session.expunge(job)
+
+    elif action == "cancelled":
+        # filament_used_g pasa a ser lo consumido (0 si no se llego a
+        # imprimir): el pronostico y los resumenes lo suman tal cual
+        values = dict(status="cancelled", completed_at=at)
+        used = 0
+        if (partial_time > 0 or partial_layer > 0) and job.hours:
+            hours, grams = partial_usage(job, partial_time, partial_layer)
+            used = int(round(grams))
+            values.update(hours=hours)
+        values.update(filament_used_g=used)
+
+        update_job(session, job, **values)
+        adjust(session, filament_id, projected=reserved - used, effective=-used)
+
+    elif action == "printing":
+        update_job(session, job, status="printing", started_at=at,
+                   planned_start=at, planned_end=at + timedelta(hours=job.hours or 0))
+
+    elif action == "done":
+        update_job(session, job, status="done", completed_at=at)
+        adjust(session, filament_id, effective=-reserved)
+
+    replan(session, printer_id, at)
+
+
+def process_job_by_id(session, job_id: int, action: str, partial_time: float = 0.0, partial_layer: int = 0, at: Optional[datetime] = None):
+    job = session.get(PrintJob, job_id)
+    if job is None:
+        raise LookupError(f"Trabajo {job_id} no encontrado")
+    process_job(session, job, action, partial_time, partial_layer, at)
+    return job
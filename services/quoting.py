@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from models import Object3D, Filament, Printer, GlobalConfig
+
+# Cotizador vectorizado: costo de cada objeto x filamento x impresora.
+#
+#   costo[o, f, p] = (peso[o] * costo_gramo[f] + horas[o] * (kwh[p] * precio_kwh + desgaste[p])) / objetos[o]
+#
+# El tensor se calcula por bloques de objetos para acotar la memoria.
+
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class QuoteInputs:
+    object_ids: np.ndarray
+    weight_g: np.ndarray
+    hours: np.ndarray
+    pieces: np.ndarray
+    filament_ids: np.ndarray
+    cost_per_g: np.ndarray
+    printer_ids: np.ndarray
+    cost_per_h: np.ndarray
+    profit_margin: float
+
+
+@dataclass
+class QuoteResult:
+    object_ids: np.ndarray      # (O,)
+    filament_ids: np.ndarray    # (O, k)
+    printer_ids: np.ndarray     # (O, k)
+    cost: np.ndarray            # (O, k)
+    suggested_price: np.ndarray # (O, k)
+
+
+def load_quote_inputs(session, object_ids: Optional[list] = None) -> QuoteInputs:
+    config = session.query(GlobalConfig).first() or GlobalConfig()
+    electricity = config.electricity_cost_kwh if config.electricity_cost_kwh is not None else 120.0
+    if config.use_manual:
+        margin = config.manual_profit_margin or 0
+    else:
+        margin = config.profit_margin if config.profit_margin is not None else 100.0
+
+    q = session.query(Object3D.id, Object3D.weight_grams, Object3D.print_time_hours, Object3D.objects)
+    if object_ids is not None:
+        q = q.filter(Object3D.id.in_(object_ids))
+    objects = np.array(q.order_by(Object3D.id).all(), dtype=np.float64).reshape(-1, 4)
+
+    filaments = np.array(
+        session.query(Filament.id, Filament.price, Filament.initial_g).order_by(Filament.id).all(),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+    printers = np.array(
+        session.query(Printer.id, Printer.power_kwh_per_hour, Printer.wear_per_hour).order_by(Printer.id).all(),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+    return QuoteInputs(
+        object_ids=objects[:, 0].astype(np.int64),
+        weight_g=objects[:, 1],
+        hours=objects[:, 2],
+        pieces=np.maximum(objects[:, 3], 1),
+        filament_ids=filaments[:, 0].astype(np.int64),
+        cost_per_g=filaments[:, 1] / np.maximum(filaments[:, 2], 1),
+        printer_ids=printers[:, 0].astype(np.int64),
+        cost_per_h=printers[:, 1] * electricity + printers[:, 2],
+        profit_margin=float(margin),
+    )
+
+
+def cost_tensor(inputs: QuoteInputs, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+    sl = slice(start, stop)
+    pieces = inputs.pieces[sl]
+    material = (inputs.weight_g[sl] / pieces)[:, None] * inputs.cost_per_g[None, :]   # (O, F)
+    machine = (inputs.hours[sl] / pieces)[:, None] * inputs.cost_per_h[None, :]       # (O, P)
+    return material[:, :, None] + machine[:, None, :]                                  # (O, F, P)
+
+
+def price_of(inputs: QuoteInputs, cost: np.ndarray) -> np.ndarray:
+    return cost * (inputs.profit_margin / 100.0 + 1)
+
+
+def top_k_quotes(inputs: QuoteInputs, k: int = 5, chunk_bytes: int = CHUNK_BYTES) -> QuoteResult:
+    n_obj = len(inputs.object_ids)
+    n_fil = len(inputs.cost_per_g)
+    n_prn = len(inputs.cost_per_h)
+    combos = n_fil * n_prn
+    k = max(min(k, combos), 0)
+
+    filament_ids = np.empty((n_obj, k), dtype=np.int64)
+    printer_ids = np.empty((n_obj, k), dtype=np.int64)
+    cost = np.empty((n_obj, k), dtype=np.float64)
+
+    if k > 0:
+        rows_per_chunk = max(1, chunk_bytes // (combos * 8))
+        for start in range(0, n_obj, rows_per_chunk):
+            stop = min(start + rows_per_chunk, n_obj)
+            flat = cost_tensor(inputs, start, stop).reshape(stop - start, combos)
+
+            if k < combos:
+                best = np.argpartition(flat, k - 1, axis=1)[:, :k]
+            else:
+                best = np.broadcast_to(np.arange(combos), flat.shape)
+            best_cost = np.take_along_axis(flat, best, axis=1)
+            order = np.argsort(best_cost, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+
+            cost[start:stop] = np.take_along_axis(best_cost, order, axis=1)
+            filament_ids[start:stop] = inputs.filament_ids[best // n_prn]
+            printer_ids[start:stop] = inputs.printer_ids[best % n_prn]
+
+    return QuoteResult(
+        object_ids=inputs.object_ids,
+        filament_ids=filament_ids,
+        printer_ids=printer_ids,
+        cost=cost,
+        suggested_price=price_of(inputs, cost),
+    )
+
+
+def order_cost_by_printer(inputs: QuoteInputs, quantities: np.ndarray, chunk_bytes: int = CHUNK_BYTES) -> np.ndarray:
+    # Costo total de un pedido (cantidad por objeto) en cada impresora,
+    # usando para cada objeto el filamento mas barato.
+    quantities = np.asarray(quantities, dtype=np.float64)
+    n_obj = len(inputs.object_ids)
+    combos = max(len(inputs.cost_per_g) * len(inputs.cost_per_h), 1)
+    total = np.zeros(len(inputs.cost_per_h), dtype=np.float64)
+    if len(inputs.cost_per_g) == 0:
+        return total
+
+    rows_per_chunk = max(1, chunk_bytes // (combos * 8))
+    for start in range(0, n_obj, rows_per_chunk):
+        stop = min(start + rows_per_chunk, n_obj)
+        best = cost_tensor(inputs, start, stop).min(axis=1)                          # (O, P)
+        total += quantities[start:stop] @ best
+    return total
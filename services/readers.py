@@ -0,0 +1,111 @@
+from typing import Iterable, Optional
+
+from sqlalchemy import select, or_
+
+from models import Object3D, Filament, Printer, PrintJob
+
+# Lectura de solo-lectura para las tablas de la interfaz: selecciona solo las
+# columnas que se muestran (SQLAlchemy Core, sin entidades ni identity map) y
+# las formatea a texto de una vez. Las escrituras siguen usando el ORM.
+
+YIELD_PER = 2000
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _dash(value) -> str:
+    return "-" if value is None else str(value)
+
+
+def _fixed2(value) -> str:
+    return "" if value is None else f"{value:.2f}"
+
+
+OBJECT_COLUMNS = (
+    (Object3D.id, _text),
+    (Object3D.name, _text),
+    (Object3D.stl_path, _text),
+    (Object3D.gcode_path, _text),
+    (Object3D.objects, _text),
+    (Object3D.weight_grams, _text),
+    (Object3D.print_time_hours, _text),
+    (Object3D.cost, _text),
+    (Object3D.suggested_price, _text),
+)
+
+FILAMENT_COLUMNS = (
+    (Filament.id, _text),
+    (Filament.name, _text),
+    (Filament.color, _text),
+    (Filament.material, _text),
+    (Filament.price, _text),
+    (Filament.initial_g, _text),
+    (Filament.remaining_g_effective, _text),
+    (Filament.remaining_g_projected, _text),
+)
+
+PRINTER_COLUMNS = (
+    (Printer.id, _text),
+    (Printer.name, _text),
+    (Printer.price, _text),
+    (Printer.wear_per_hour, _fixed2),
+    (Printer.power_kwh_per_hour, _fixed2),
+)
+
+QUEUE_COLUMNS = (
+    (PrintJob.id, _text),
+    (Object3D.name.label("object_name"), _dash),
+    (Filament.name.label("filament_name"), _dash),
+    (PrintJob.quantity, _text),
+    (PrintJob.status, _text),
+)
+
+
+def stream(session, columns: Iterable, *criteria, order_by=None, joins=(), yield_per: int = YIELD_PER):
+    cols = [c for c, _ in columns]
+    stmt = select(*cols)
+    for target, onclause in joins:
+        stmt = stmt.outerjoin(target, onclause)
+    if criteria:
+        stmt = stmt.where(*criteria)
+    stmt = stmt.order_by(order_by if order_by is not None else cols[0])
+    # conexion propia del pool: no deja transacciones abiertas en la sesion del tab
+    with session.get_bind().connect() as conn:
+        yield from conn.execute(stmt.execution_options(yield_per=yield_per))
+
+
+def format_rows(rows, columns: Iterable) -> list:
+    formatters = [fmt for _, fmt in columns]
+    return [tuple(fmt(v) for fmt, v in zip(formatters, row)) for row in rows]
+
+
+def object_rows(session) -> list:
+    return format_rows(stream(session, OBJECT_COLUMNS), OBJECT_COLUMNS)
+
+
+def filament_rows(session, text: Optional[str] = None):
+    # devuelve (filas crudas, filas formateadas); las crudas sirven para el pronostico
+    criteria = []
+    if text:
+        pattern = f"%{text}%"
+        criteria.append(or_(Filament.name.ilike(pattern), Filament.color.ilike(pattern), Filament.material.ilike(pattern)))
+    raw = list(stream(session, FILAMENT_COLUMNS, *criteria))
+    return raw, format_rows(raw, FILAMENT_COLUMNS)
+
+
+def printer_rows(session, text: Optional[str] = None) -> list:
+    criteria = [Printer.name.ilike(f"%{text}%")] if text else []
+    return format_rows(stream(session, PRINTER_COLUMNS, *criteria), PRINTER_COLUMNS)
+
+
+def queue_rows(session, statuses: Iterable[str]) -> list:
+    return format_rows(
+        stream(
+            session, QUEUE_COLUMNS, PrintJob.status.in_(list(statuses)),
+            joins=((Object3D, Object3D.id == PrintJob.object_id), (Filament, Filament.id == PrintJob.filament_id)),
+            order_by=PrintJob.id,
+        ),
+        QUEUE_COLUMNS,
+    )
@@ -0,0 +1,120 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import select
+
+from models import Object3D, Filament, Printer, ReferenceVersion
+
+# Cache de catalogos (objetos, filamentos, impresoras) para los selectores.
+#
+# Cada catalogo guarda solo id, nombre y algunos atributos, ordenado por el
+# nombre normalizado para buscar prefijos con bisect. Se valida contra
+# reference_versions (una consulta de pocas filas): los flush del ORM que
+# cambian esas filas suben la version (ver models.REFERENCE_COLUMNS, que debe
+# cubrir las columnas de _SOURCES), tambien desde otros procesos como el
+# watcher, y solo entonces se recarga el catalogo.
+
+_SOURCES = {
+    "objects": (Object3D, (Object3D.weight_grams, Object3D.print_time_hours)),
+    "filaments": (Filament, (Filament.material, Filament.color)),
+    "printers": (Printer, ()),
+}
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+def _label(kind: str, name: str, extra: tuple) -> str:
+    if kind == "filaments":
+        detail = " ".join(v for v in extra if v)
+        return f"{name} ({detail})" if detail else name
+    return name
+
+
+class Catalog:
+    __slots__ = ("kind", "version", "ids", "labels", "keys", "extra", "positions")
+
+    def __init__(self, kind: str, version: int, rows: list):
+        self.kind = kind
+        self.version = version
+        entries = [(_label(kind, name, extra), id_, tuple(extra)) for id_, name, *extra in rows]
+        # nombres repetidos: se distinguen por id
+        seen = Counter(normalize(label) for label, _, _ in entries)
+        entries = [
+            (f"{label} #{id_}" if seen[normalize(label)] > 1 else label, id_, extra)
+            for label, id_, extra in entries
+        ]
+        entries.sort(key=lambda e: normalize(e[0]))
+
+        self.labels = [label for label, _, _ in entries]
+        self.keys = [normalize(label) for label in self.labels]
+        self.ids = [id_ for _, id_, _ in entries]
+        self.extra = [extra for _, _, extra in entries]
+        self.positions = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def prefix_range(self, prefix: str) -> tuple:
+        key = normalize(prefix)
+        if not key:
+            return 0, len(self.keys)
+        lo = bisect_left(self.keys, key)
+        hi = bisect_left(self.keys, key + "\U0010ffff", lo)
+        return lo, hi
+
+    def position(self, id_: int) -> int:
+        if self.positions is None:
+            self.positions = {id_: i for i, id_ in enumerate(self.ids)}
+        return self.positions.get(id_, -1)
+
+    def find(self, text: str) -> Optional[int]:
+        # id del elemento cuya etiqueta coincide exactamente con `text`
+        key = normalize(text)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.ids[i]
+        return None
+
+
+class ReferenceCache:
+    def __init__(self):
+        self.catalogs = {}
+        self._lock = threading.Lock()
+
+    def versions(self, session) -> dict:
+        t = ReferenceVersion.__table__
+        with session.get_bind().connect() as conn:
+            return dict(conn.execute(select(t.c.kind, t.c.version)).all())
+
+    def _load(self, session, kind: str, version: int) -> Catalog:
+        model, extra = _SOURCES[kind]
+        with session.get_bind().connect() as conn:
+            rows = conn.execute(select(model.id, model.name, *extra)).all()
+        return Catalog(kind, version, rows)
+
+    def get(self, session, kind: str, versions: Optional[dict] = None) -> Catalog:
+        versions = self.versions(session) if versions is None else versions
+        version = versions.get(kind, 0)
+        with self._lock:
+            catalog = self.catalogs.get(kind)
+            if catalog is None or catalog.version != version:
+                catalog = self.catalogs[kind] = self._load(session, kind, version)
+            return catalog
+
+    def get_all(self, session, *kinds) -> list:
+        versions = self.versions(session)
+        return [self.get(session, kind, versions) for kind in kinds]
+
+    def invalidate(self, kind: Optional[str] = None):
+        with self._lock:
+            if kind is None:
+                self.catalogs.clear()
+            else:
+                self.catalogs.pop(kind, None)
+
+
+catalogs = ReferenceCache()
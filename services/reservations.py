@@ -0,0 +1,84 @@
+import time
+import random
+
+from sqlalchemy import update, delete
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import Filament, PrintJob
+
+# Cambios de saldo de filamento y de estado de trabajos como sentencias SQL
+# atomicas, seguras con varios procesos escribiendo a la vez (app, poller,
+# API, watcher). Los saldos se modifican con UPDATE ... SET x = x +/- :g, y
+# los trabajos con bloqueo optimista sobre la columna `version`.
+
+RETRIES = 5
+
+
+class InsufficientFilament(Exception):
+    pass
+
+
+class ConcurrentUpdate(Exception):
+    pass
+
+
+def reserve(session, filament_id: int, grams: int):
+    t = Filament.__table__
+    result = session.execute(
+        update(t)
+        .where(t.c.id == filament_id, t.c.remaining_g_projected >= grams)
+        .values(remaining_g_projected=t.c.remaining_g_projected - grams, version=t.c.version + 1)
+    )
+    if result.rowcount == 0:
+        raise InsufficientFilament(f"Filamento insuficiente para reservar {grams} g")
+
+
+def adjust(session, filament_id: int, projected: int = 0, effective: int = 0):
+    # suma (o resta, si es negativo) a los saldos sin leerlos antes
+    if not projected and not effective:
+        return
+    t = Filament.__table__
+    session.execute(
+        update(t)
+        .where(t.c.id == filament_id)
+        .values(
+            remaining_g_projected=t.c.remaining_g_projected + projected,
+            remaining_g_effective=t.c.remaining_g_effective + effective,
+            version=t.c.version + 1,
+        )
+    )
+
+
+def update_job(session, job: PrintJob, **values):
+    t = PrintJob.__table__
+    result = session.execute(
+        update(t)
+        .where(t.c.id == job.id, t.c.version == job.version)
+        .values(version=t.c.version + 1, **values)
+    )
+    if result.rowcount == 0:
+        raise ConcurrentUpdate(f"El trabajo {job.id} fue modificado por otro proceso")
+
+
+def delete_job(session, job: PrintJob):
+    t = PrintJob.__table__
+    result = session.execute(delete(t).where(t.c.id == job.id, t.c.version == job.version))
+    if result.rowcount == 0:
+        raise ConcurrentUpdate(f"El trabajo {job.id} fue modificado por otro proceso")
+
+
+def with_retry(session, fn, *args, retries: int = RETRIES, **kwargs):
+    # `fn` debe releer lo que necesite: en cada intento la sesion parte limpia
+    for attempt in range(retries):
+        try:
+            result = fn(session, *args, **kwargs)
+            session.commit()
+            return result
+        except (ConcurrentUpdate, StaleDataError):
+            session.rollback()
+            if attempt == retries - 1:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+        except Exception:
+            session.rollback()
+            raise
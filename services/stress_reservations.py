@@ -0,0 +1,125 @@
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+from multiprocessing import Pool
+
+from sqlalchemy.orm import sessionmaker
+
+from database import create_db_engine
+
+# Prueba de carga de las reservas de filamento: varios procesos encolan y
+# procesan trabajos sobre el mismo rollo a la vez y al final se comprueba que
+# los saldos del rollo cuadran con los trabajos (sin deriva).
+#
+#   python -m services.stress_reservations [procesos] [operaciones]
+#
+# Usa una base SQLite temporal; sale con 1 si hay deriva.
+
+INITIAL_G = 5000
+WEIGHT_G = 10
+
+
+def _setup(url: str, path: str):
+    from models import Object3D, Filament, Printer
+    from services.migrations import migrate
+
+    engine = create_db_engine(url)
+    migrate(engine)
+    with sessionmaker(bind=engine)() as s:
+        s.add_all([
+            Object3D(name="Prueba", stl_path="", gcode_path="", objects=1, weight_grams=WEIGHT_G,
+                     print_time_hours=1.0, cost=0, suggested_price=0),
+            Filament(name="PLA", price=1, initial_g=INITIAL_G, remaining_g_effective=INITIAL_G,
+                     remaining_g_projected=INITIAL_G),
+            Printer(name="Impresora", price=1, wear_per_hour=0, power_kwh_per_hour=0),
+        ])
+        s.commit()
+    engine.dispose()
+
+    # los trabajos terminados o cancelados que se eliminan siguen contando como consumo
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE stress_deleted (status TEXT, grams INTEGER);
+            CREATE TRIGGER stress_deleted_jobs AFTER DELETE ON print_jobs BEGIN
+                INSERT INTO stress_deleted VALUES (old.status, old.filament_used_g);
+            END;
+        """)
+
+
+def _worker(args) -> tuple:
+    url, seed, operations = args
+    from models import Object3D, Filament, Printer, PrintJob
+    from services.queue_ops import ACTIVE_STATUSES, enqueue_job, process_job_by_id
+    from services.reservations import with_retry, InsufficientFilament, ConcurrentUpdate
+
+    rng = random.Random(seed)
+    engine = create_db_engine(url)
+    done = rejected = 0
+    with sessionmaker(bind=engine)() as s:
+        for _ in range(operations):
+            try:
+                if rng.random() < 0.5:
+                    obj, spool, printer = s.get(Object3D, 1), s.get(Filament, 1), s.get(Printer, 1)
+                    enqueue_job(s, obj, spool, printer, rng.randint(1, 3))
+                    s.commit()
+                else:
+                    ids = [i for (i,) in s.query(PrintJob.id).filter(PrintJob.status.in_(ACTIVE_STATUSES))]
+                    if not ids:
+                        continue
+                    action = rng.choice(("done", "cancelled", "deleted", "printing"))
+                    with_retry(s, process_job_by_id, rng.choice(ids), action)
+                done += 1
+            except (InsufficientFilament, ConcurrentUpdate, ValueError, LookupError):
+                # rechazos esperados: sin filamento, conflicto agotado o
+                # trabajo ya procesado por otro proceso
+                s.rollback()
+                rejected += 1
+    engine.dispose()
+    return done, rejected
+
+
+def drift(path: str) -> dict:
+    # diferencia entre los saldos del rollo y lo que dicen los trabajos; los
+    # cancelados guardan lo consumido (0 sin tiempo impreso)
+    with sqlite3.connect(path) as conn:
+        effective, projected = conn.execute(
+            "SELECT remaining_g_effective, remaining_g_projected FROM filaments WHERE id = 1"
+        ).fetchone()
+        reserved = conn.execute(
+            "SELECT COALESCE(SUM(filament_used_g), 0) FROM print_jobs WHERE status IN ('pending', 'printing')"
+        ).fetchone()[0]
+        used = conn.execute(
+            "SELECT (SELECT COALESCE(SUM(filament_used_g), 0) FROM print_jobs WHERE status IN ('done', 'cancelled'))"
+            " + (SELECT COALESCE(SUM(grams), 0) FROM stress_deleted WHERE status IN ('done', 'cancelled'))"
+        ).fetchone()[0]
+    return {
+        "efectivo": effective - (INITIAL_G - used),
+        "proyectado": projected - (INITIAL_G - used - reserved),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    processes = int(argv[0]) if argv else 6
+    operations = int(argv[1]) if len(argv) > 1 else 150
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stress.db")
+        url = f"sqlite:///{path}"
+        _setup(url, path)
+        with Pool(processes) as pool:
+            results = pool.map(_worker, [(url, seed, operations) for seed in range(processes)])
+        result = drift(path)
+
+    done = sum(r[0] for r in results)
+    rejected = sum(r[1] for r in results)
+    print(f"{processes} procesos: {done} operaciones, {rejected} rechazadas")
+    for name, grams in result.items():
+        print(f"deriva {name}: {grams} g")
+    return 1 if any(result.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
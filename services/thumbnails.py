@@ -0,0 +1,337 @@
+import io
+import os
+import re
+import sys
+import zlib
+import struct
+import logging
+import zipfile
+import threading
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import numpy as np
+
+from services.asset_store import find_blob, hash_file, open_asset
+
+# Miniaturas de modelos STL/3MF renderizadas en CPU, sin GPU ni OpenGL.
+#
+# La malla se simplifica por agrupamiento de vertices en una rejilla hasta
+# quedar bajo TRIANGLE_BUDGET triangulos y se rasteriza en vista isometrica
+# con un z-buffer de NumPy (todos los triangulos a la vez, sin bucles por
+# pixel). El PNG se guarda bajo el sha256 del archivo, asi que un modelo ya
+# renderizado no se vuelve a leer aunque cambie de ruta.
+#
+#   python -m services.thumbnails [--size 256]   genera las que falten
+
+log = logging.getLogger(__name__)
+
+THUMB_ROOT = os.environ.get("THUMB_ROOT", "thumbnails")
+THUMB_SIZE = 256
+TRIANGLE_BUDGET = 50000
+SUPERSAMPLE = 2
+MAX_FRAGMENTS = 4_000_000      # pixeles candidatos por bloque de rasterizado
+
+BASE_COLOR = np.array([176, 196, 222], dtype=np.float32)   # lightsteelblue
+LIGHT = np.array([0.3, -0.5, 0.8], dtype=np.float32)
+LIGHT /= np.linalg.norm(LIGHT)
+
+_STL_RECORD = np.dtype([("normal", "<f4", 3), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+_ASCII_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+# --- lectura ---
+
+def parse_stl(data: bytes) -> np.ndarray:
+    # triangulos (n, 3, 3) float32; binario o ASCII
+    if len(data) >= 84:
+        count = struct.unpack_from("<I", data, 80)[0]
+        if len(data) == 84 + count * _STL_RECORD.itemsize:
+            return np.frombuffer(data, _STL_RECORD, count, 84)["v"]
+    vertices = np.array(_ASCII_VERTEX.findall(data), dtype=np.float32)
+    return vertices[: len(vertices) // 3 * 3].reshape(-1, 3, 3)
+
+
+def parse_3mf(fh) -> np.ndarray:
+    meshes = []
+    with zipfile.ZipFile(fh) as zf:
+        names = [n for n in zf.namelist() if n.lower().endswith(".model")]
+        for name in names:
+            vertices, triangles = [], []
+            with zf.open(name) as model:
+                for _event, elem in ET.iterparse(model):
+                    tag = elem.tag.rsplit("}", 1)[-1]
+                    if tag == "vertex":
+                        vertices.append((elem.get("x"), elem.get("y"), elem.get("z")))
+                    elif tag == "triangle":
+                        triangles.append((elem.get("v1"), elem.get("v2"), elem.get("v3")))
+                    elif tag == "mesh":
+                        if vertices and triangles:
+                            v = np.array(vertices, dtype=np.float32)
+                            t = np.array(triangles, dtype=np.int64)
+                            meshes.append(v[t])
+                        vertices, triangles = [], []
+                    elem.clear()
+    if not meshes:
+        return np.zeros((0, 3, 3), np.float32)
+    return np.concatenate(meshes)
+
+
+def load_mesh(path: str = "", digest: Optional[str] = None) -> np.ndarray:
+    # el archivo original si sigue en su ruta, si no el asset guardado
+    if path and os.path.exists(path):
+        with open(path, "rb") as fh:
+            data = fh.read()
+    elif digest:
+        with open_asset(digest) as fh:
+            data = fh.read()
+    else:
+        return np.zeros((0, 3, 3), np.float32)
+    if data[:2] == b"PK":
+        return parse_3mf(io.BytesIO(data))
+    return parse_stl(data)
+
+
+# --- simplificacion ---
+
+def _cluster(tris: np.ndarray, lo: np.ndarray, cell: float, grid: int) -> np.ndarray:
+    q = np.minimum(((tris - lo) / cell).astype(np.int64), grid - 1)
+    keys = q[..., 0] + grid * (q[..., 1] + grid * q[..., 2])            # (n, 3)
+    keep = (keys[:, 0] != keys[:, 1]) & (keys[:, 1] != keys[:, 2]) & (keys[:, 0] != keys[:, 2])
+    return keys[keep], tris[keep]
+
+
+def decimate(tris: np.ndarray, budget: int = TRIANGLE_BUDGET) -> np.ndarray:
+    # agrupamiento de vertices: cada celda de la rejilla se reduce a un vertice
+    # (el promedio de los que caen en ella) y los triangulos degenerados o
+    # repetidos se eliminan. La rejilla se ajusta hasta quedar bajo `budget`.
+    if len(tris) <= budget:
+        return tris
+    lo = tris.reshape(-1, 3).min(axis=0)
+    extent = float((tris.reshape(-1, 3).max(axis=0) - lo).max()) or 1.0
+
+    # una superficie cerrada deja del orden de 8 triangulos por celda^2 de la rejilla
+    grid = max(int(np.sqrt(budget / 8)), 4)
+    while True:
+        cell = extent / grid * (1 + 1e-6)
+        keys, kept = _cluster(tris, lo, cell, grid)
+        # mismo triangulo con los vertices en otro orden
+        _, first = np.unique(np.sort(keys, axis=1), axis=0, return_index=True)
+        keys, kept = keys[first], kept[first]
+        if len(keys) <= budget or grid <= 4:
+            break
+        grid = max(int(grid * np.sqrt(budget / len(keys)) * 0.95), 4)
+
+    cells, inverse = np.unique(keys.ravel(), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(cells)).astype(np.float32)
+    points = kept.reshape(-1, 3)
+    centers = np.stack([np.bincount(inverse, points[:, axis], len(cells)) for axis in range(3)], axis=1)
+    centers = (centers / counts[:, None]).astype(np.float32)
+    return centers[inverse.reshape(-1, 3)]
+
+
+# --- rasterizado ---
+
+def _isometric(tris: np.ndarray) -> np.ndarray:
+    # camara delante-derecha-arriba; z del STL hacia arriba
+    forward = np.array([-1.0, 1.0, -1.0], dtype=np.float32) / np.sqrt(3)
+    right = np.cross(forward, [0, 0, 1]).astype(np.float32)
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+    return tris @ np.stack([right, up, forward], axis=1)
+
+
+def rasterize(tris: np.ndarray, size: int = THUMB_SIZE, supersample: int = SUPERSAMPLE) -> np.ndarray:
+    # imagen RGBA (size, size, 4) uint8 con fondo transparente
+    res = size * supersample
+    rgb = np.zeros((res * res, 3), np.float32)
+    alpha = np.zeros(res * res, np.float32)
+    if len(tris) == 0:
+        return np.zeros((size, size, 4), np.uint8)
+
+    view = _isometric(tris.astype(np.float32))
+
+    # sombreado plano de dos caras
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1)[:, None]
+    shade = 0.3 + 0.7 * np.abs(normals @ LIGHT)
+    colors = np.clip(BASE_COLOR * shade[:, None], 0, 255)
+
+    # encuadre: el modelo ocupa la imagen con un margen del 5%
+    xy = view[..., :2]
+    lo = xy.reshape(-1, 2).min(axis=0)
+    span = float((xy.reshape(-1, 2).max(axis=0) - lo).max()) or 1.0
+    scale = res * 0.9 / span
+    offset = (res - (xy.reshape(-1, 2).max(axis=0) - lo) * scale) / 2
+    x = (xy[..., 0] - lo[0]) * scale + offset[0]
+    y = res - ((xy[..., 1] - lo[1]) * scale + offset[1])               # y de imagen hacia abajo
+    z = view[..., 2]
+
+    x0, y0 = np.floor(x.min(axis=1)).astype(np.int64), np.floor(y.min(axis=1)).astype(np.int64)
+    x1, y1 = np.ceil(x.max(axis=1)).astype(np.int64), np.ceil(y.max(axis=1)).astype(np.int64)
+    x0, y0 = np.clip(x0, 0, res - 1), np.clip(y0, 0, res - 1)
+    x1, y1 = np.clip(x1, 0, res - 1), np.clip(y1, 0, res - 1)
+    w, h = x1 - x0 + 1, y1 - y0 + 1
+
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0])
+    visible = np.nonzero(np.abs(area) > 1e-9)[0]
+
+    depth = np.full(res * res, np.inf, np.float32)
+    # por bloques de triangulos para acotar la memoria de los fragmentos
+    total = np.cumsum((w * h)[visible])
+    start = 0
+    while start < len(visible):
+        base = total[start - 1] if start else 0
+        stop = max(int(np.searchsorted(total, base + MAX_FRAGMENTS, side="right")), start + 1)
+        idx = visible[start:stop]
+        start = stop
+        counts = w[idx] * h[idx]
+        tri = np.repeat(idx, counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        px = x0[tri] + local % w[tri]
+        py = y0[tri] + local // w[tri]
+        cx, cy = px + 0.5, py + 0.5
+
+        # coordenadas baricentricas del centro del pixel
+        tx, ty = x[tri], y[tri]
+        inv = 1.0 / area[tri]
+        b0 = ((tx[:, 1] - cx) * (ty[:, 2] - cy) - (tx[:, 2] - cx) * (ty[:, 1] - cy)) * inv
+        b1 = ((tx[:, 2] - cx) * (ty[:, 0] - cy) - (tx[:, 0] - cx) * (ty[:, 2] - cy)) * inv
+        b2 = 1.0 - b0 - b1
+        inside = (b0 >= 0) & (b1 >= 0) & (b2 >= 0)
+        tri, px, py = tri[inside], px[inside], py[inside]
+        zf = (b0[inside] * z[tri, 0] + b1[inside] * z[tri, 1] + b2[inside] * z[tri, 2]).astype(np.float32)
+
+        # z-buffer: por pixel gana el fragmento mas cercano
+        pix = py * res + px
+        order = np.lexsort((zf, pix))
+        pix, zf, tri = pix[order], zf[order], tri[order]
+        first = np.r_[True, pix[1:] != pix[:-1]]
+        pix, zf, tri = pix[first], zf[first], tri[first]
+        closer = zf < depth[pix]
+        pix, tri = pix[closer], tri[closer]
+        depth[pix] = zf[closer]
+        rgb[pix] = colors[tri]
+        alpha[pix] = 255
+
+    image = np.concatenate([rgb, alpha[:, None]], axis=1).reshape(size, supersample, size, supersample, 4)
+    return image.mean(axis=(1, 3)).round().astype(np.uint8)
+
+
+def write_png(path: str, image: np.ndarray):
+    height, width, channels = image.shape
+    color_type = {3: 2, 4: 6}[channels]
+    raw = b"".join(b"\x00" + image[row].tobytes() for row in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    png = (b"\x89PNG\r\n\x1a\n"
+           + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(raw, 6))
+           + chunk(b"IEND", b""))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(png)
+    os.replace(tmp, path)
+
+
+# --- cache ---
+
+def thumbnail_path(digest: str, size: int = THUMB_SIZE, root: str = THUMB_ROOT) -> str:
+    return os.path.join(root, digest[:2], f"{digest}-{size}.png")
+
+
+def render_thumbnail(path: str = "", digest: Optional[str] = None, size: int = THUMB_SIZE,
+                     budget: int = TRIANGLE_BUDGET, root: str = THUMB_ROOT) -> Optional[str]:
+    # se ejecuta en los procesos del pool; devuelve la ruta del PNG o None
+    try:
+        # la clave de la miniatura es el hash de lo que se lee: con asset se
+        # renderiza el asset aunque el archivo original haya cambiado despues
+        if digest:
+            try:
+                find_blob(digest)
+                path = ""
+            except FileNotFoundError:
+                digest = None
+        if not digest:
+            if not path or not os.path.exists(path):
+                return None
+            digest, _size = hash_file(path)
+        target = thumbnail_path(digest, size, root)
+        if os.path.exists(target):
+            return target
+
+        tris = load_mesh(path, digest)
+        if len(tris) == 0:
+            return None
+        image = rasterize(decimate(tris, budget), size)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        write_png(target, image)
+        return target
+    except (OSError, ValueError, zipfile.BadZipFile, ET.ParseError, RuntimeError) as e:
+        log.warning("No se pudo generar la miniatura de %s: %s", path or digest, e)
+        return None
+
+
+def _source(obj) -> tuple:
+    path = obj.stl_path or ""
+    if not path.lower().endswith((".stl", ".3mf")):
+        path = ""
+    return path, obj.stl_hash
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool(reset: bool = False) -> ProcessPoolExecutor:
+    # spawn: no hacer fork de un proceso con los hilos de Qt
+    global _pool
+    with _pool_lock:
+        if reset and _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def request_thumbnail(obj, size: int = THUMB_SIZE):
+    # Future con la ruta del PNG; para la interfaz, que no debe bloquearse
+    path, digest = _source(obj)
+    try:
+        return _shared_pool().submit(render_thumbnail, path, digest, size)
+    except BrokenProcessPool:
+        # un proceso murio (por ejemplo, sin memoria con un modelo enorme)
+        return _shared_pool(reset=True).submit(render_thumbnail, path, digest, size)
+
+
+def render_thumbnails(objects: list, size: int = THUMB_SIZE, workers: Optional[int] = None) -> dict:
+    # object_id -> ruta del PNG (o None); un modelo por tarea, en paralelo
+    sources = {obj.id: _source(obj) for obj in objects}
+    sources = {oid: src for oid, src in sources.items() if src[0] or src[1]}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {oid: pool.submit(render_thumbnail, path, digest, size) for oid, (path, digest) in sources.items()}
+        return {oid: future.result() for oid, future in futures.items()}
+
+
+def main(argv=None):
+    from database import SessionLocal
+    from models import Object3D
+
+    argv = sys.argv[1:] if argv is None else argv
+    size = int(argv[argv.index("--size") + 1]) if "--size" in argv else THUMB_SIZE
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        objects = session.query(Object3D).all()
+    done = render_thumbnails(objects, size)
+    print(f"{sum(1 for p in done.values() if p)} de {len(done)} miniaturas disponibles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from models import PrintJob, PrintJobArchive
+from services.archive import FINISHED_STATUSES
+
+# Ocupacion de impresoras en el tiempo.
+#
+# Cada trabajo es un intervalo [inicio, fin) en segundos epoch (UTC): real si
+# ya empezo o termino, planificado si esta en cola. Por impresora se guardan
+# arrays ordenados por inicio, el maximo acumulado de los fines (para buscar
+# solapes con busqueda binaria) y la union de los intervalos con su duracion
+# acumulada (para disponibilidad y utilizacion). Las consultas son
+# O(log n + resultado). El archivo no cambia, asi que solo se leen sus filas
+# nuevas; print_jobs se relee entera en cada refresh.
+
+STATUSES = ("pending", "printing", "done", "cancelled")
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+_FIELDS = ("printer_id", "id", "object_id", "status", "hours", "created_at",
+           "completed_at", "planned_start", "planned_end", "started_at")
+
+
+def to_epoch(value: datetime) -> int:
+    return int((value - datetime(1970, 1, 1)).total_seconds())
+
+
+def from_epoch(seconds) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(seconds=int(seconds))
+
+
+_NAT = np.datetime64("NaT").astype(np.int64)
+
+
+def _seconds(values) -> np.ndarray:
+    # datetimes (o None) -> int64; None queda como _NAT
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def _intervals(rows: list, now: int) -> dict:
+    if not rows:
+        return dict(printer=np.zeros(0, np.int64), job=np.zeros(0, np.int64), object=np.zeros(0, np.int64),
+                    status=np.zeros(0, np.int8), start=np.zeros(0, np.int64), end=np.zeros(0, np.int64))
+    cols = list(zip(*rows))
+    status = np.array([STATUS_CODES.get(s, 0) for s in cols[3]], dtype=np.int8)
+    duration = (np.array(cols[4], dtype=np.float64) * 3600).astype(np.int64)
+    created, completed, p_start, p_end, started = (_seconds(c) for c in cols[5:])
+
+    finished = np.isin(status, [STATUS_CODES[s] for s in FINISHED_STATUSES])
+    has_started = started != _NAT
+
+    # inicio: real, si no el planificado; los terminados sin inicio registrado
+    # (datos antiguos) se estiman hacia atras desde completed_at
+    start = np.where(has_started, started, np.where(p_start != _NAT, p_start, created))
+    start = np.where(finished & ~has_started & (completed != _NAT), np.maximum(created, completed - duration), start)
+
+    end = np.where(p_end != _NAT, p_end, start + duration)
+    end = np.where(finished & (completed != _NAT), completed, end)
+    end = np.where(status == STATUS_CODES["printing"], np.maximum(end, now), end)
+    end = np.maximum(end, start)
+
+    return dict(
+        printer=np.array(cols[0], dtype=np.int64), job=np.array(cols[1], dtype=np.int64),
+        object=np.array(cols[2], dtype=np.int64), status=status, start=start, end=end,
+    )
+
+
+@dataclass
+class Spans:
+    job: np.ndarray
+    object: np.ndarray
+    status: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+
+    def __len__(self):
+        return len(self.job)
+
+
+class PrinterLane:
+    __slots__ = ("job", "object", "status", "start", "end", "max_end", "busy_start", "busy_end", "busy_before")
+
+    def __init__(self, job, object_ids, status, start, end):
+        self.job, self.object, self.status, self.start, self.end = job, object_ids, status, start, end
+        self.max_end = np.maximum.accumulate(end) if len(end) else end
+
+        # union de intervalos: un bloque nuevo empieza donde el inicio supera
+        # todos los fines anteriores
+        if len(start):
+            breaks = start[1:] > self.max_end[:-1]
+            self.busy_start = start[np.r_[True, breaks]]
+            self.busy_end = self.max_end[np.r_[breaks, True]]
+        else:
+            self.busy_start = self.busy_end = start
+        self.busy_before = np.r_[0, np.cumsum(self.busy_end - self.busy_start)]
+
+    def __len__(self):
+        return len(self.job)
+
+    def _window(self, t0: int, t1: int) -> np.ndarray:
+        hi = np.searchsorted(self.start, t1, side="left")
+        lo = np.searchsorted(self.max_end, t0, side="right")
+        if lo >= hi:
+            return np.zeros(0, np.int64)
+        return lo + np.nonzero(self.end[lo:hi] > t0)[0]
+
+    def overlapping(self, t0: int, t1: int) -> Spans:
+        idx = self._window(t0, t1)
+        return Spans(self.job[idx], self.object[idx], self.status[idx], self.start[idx], self.end[idx])
+
+    def busy_blocks(self, t0: int, t1: int):
+        lo = np.searchsorted(self.busy_end, t0, side="right")
+        hi = np.searchsorted(self.busy_start, t1, side="left")
+        return self.busy_start[lo:hi], self.busy_end[lo:hi]
+
+    def busy_until(self, t: int) -> int:
+        # segundos ocupados antes de t
+        i = np.searchsorted(self.busy_start, t, side="right") - 1
+        if i < 0:
+            return 0
+        return int(self.busy_before[i] + min(t, self.busy_end[i]) - self.busy_start[i])
+
+    def utilization(self, t0: int, t1: int) -> float:
+        if t1 <= t0:
+            return 0.0
+        return (self.busy_until(t1) - self.busy_until(t0)) / (t1 - t0)
+
+    def next_free(self, after: int, duration: int = 0) -> int:
+        # primer hueco de al menos `duration` segundos desde `after`; sin
+        # duracion es una busqueda binaria, con duracion recorre los huecos
+        # siguientes (en la practica, solo la cola pendiente)
+        i = np.searchsorted(self.busy_end, after, side="right")
+        t = after
+        n = len(self.busy_start)
+        while i < n and self.busy_start[i] < t + max(duration, 1):
+            t = max(t, int(self.busy_end[i]))
+            i += 1
+        return t
+
+
+class TimelineIndex:
+    def __init__(self):
+        self.lanes = {}
+        self._archived = _intervals([], 0)
+        self._archive_cursor = 0
+
+    def _read_archive(self, session, now: int):
+        t = PrintJobArchive.__table__
+        rows = session.execute(
+            select(t.c.archive_id, *[t.c[name] for name in _FIELDS])
+            .where(t.c.archive_id > self._archive_cursor)
+            .order_by(t.c.archive_id)
+        ).all()
+        if not rows:
+            return
+        self._archive_cursor = rows[-1][0]
+        new = _intervals([row[1:] for row in rows], now)
+        self._archived = {k: np.concatenate([self._archived[k], new[k]]) for k in new}
+
+    def refresh(self, session, now: Optional[datetime] = None):
+        now = to_epoch(now or datetime.utcnow())
+        self._read_archive(session, now)
+        t = PrintJob.__table__
+        live = _intervals(session.execute(select(*[t.c[name] for name in _FIELDS])).all(), now)
+
+        # un trabajo recien archivado puede estar en ambas lecturas; solo los
+        # terminados se archivan, asi que un pendiente con el mismo id (ids
+        # reutilizados antes de la migracion 9) no oculta el archivado
+        archived = self._archived
+        finished = np.isin(live["status"], [STATUS_CODES[s] for s in FINISHED_STATUSES])
+        keep = ~np.isin(archived["job"], live["job"][finished])
+        data = {k: np.concatenate([archived[k][keep], live[k]]) for k in live}
+
+        order = np.lexsort((data["start"], data["printer"]))
+        data = {k: v[order] for k, v in data.items()}
+        printers, first = np.unique(data["printer"], return_index=True)
+        bounds = np.r_[first, len(order)]
+
+        self.lanes = {
+            int(pid): PrinterLane(*(data[k][a:b] for k in ("job", "object", "status", "start", "end")))
+            for pid, a, b in zip(printers, bounds[:-1], bounds[1:])
+        }
+        return self
+
+    def lane(self, printer_id: int) -> PrinterLane:
+        lane = self.lanes.get(printer_id)
+        if lane is None:
+            empty = np.zeros(0, np.int64)
+            lane = PrinterLane(empty, empty, np.zeros(0, np.int8), empty, empty)
+        return lane
+
+    def overlapping(self, printer_id: int, start: datetime, end: datetime) -> Spans:
+        return self.lane(printer_id).overlapping(to_epoch(start), to_epoch(end))
+
+    def next_free(self, printer_id: int, after: Optional[datetime] = None, hours: float = 0.0) -> datetime:
+        after = after or datetime.utcnow()
+        return from_epoch(self.lane(printer_id).next_free(to_epoch(after), int(hours * 3600)))
+
+    def utilization(self, printer_id: int, start: datetime, end: datetime) -> float:
+        return self.lane(printer_id).utilization(to_epoch(start), to_epoch(end))
@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+import time
+import logging
+import zipfile
+import threading
+from datetime import datetime
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # sin inotify se usa el sondeo periodico
+    INotify = None
+
+from database import SessionLocal
+from models import Object3D, WatchedFile
+from services.asset_store import attach_object_files
+from services.costing import get_cost_parameters_and_profit_margin, compute_cost
+from services.gcode_index import parse_index
+
+# Vigila carpetas donde los slicers dejan G-code / 3MF y crea o actualiza el
+# Object3D correspondiente. Usa inotify en Linux (paquete opcional
+# `inotify_simple`) y sondeo periodico en otro caso. watched_files guarda
+# tamaño y mtime de cada archivo ya indexado, asi que al reiniciar solo se
+# analizan los archivos nuevos o modificados.
+#
+#   python -m services.watch_folder /ruta/a/carpeta [...]
+
+log = logging.getLogger(__name__)
+
+EXTENSIONS = (".gcode", ".gco", ".3mf")
+SETTLE_S = 2.0          # el archivo debe estar quieto este tiempo antes de leerlo
+POLL_S = 10.0           # intervalo de sondeo sin inotify
+BATCH_SIZE = 500
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 256 * 1024
+
+# filamento de 1.75 mm, PLA
+FILAMENT_AREA_MM2 = 3.14159265 * (1.75 / 2) ** 2
+FILAMENT_DENSITY_G_CM3 = 1.24
+
+_WEIGHT_PATTERNS = (
+    re.compile(r"filament used \[g\]\s*=\s*([\d.,\s]+)"),
+    re.compile(r"total filament weight \[g\]\s*:\s*([\d.,\s]+)"),
+)
+_TIME_PATTERNS = (
+    re.compile(r"estimated printing time \(normal mode\)\s*=\s*([^\n;]+)"),
+    re.compile(r"total estimated time\s*:\s*([^\n;]+)"),
+)
+_CURA_TIME = re.compile(r";TIME:(\d+)")
+_CURA_FILAMENT_M = re.compile(r";Filament used:\s*([\d.]+)m")
+_DURATION = re.compile(r"(\d+)\s*([dhms])")
+
+
+def _duration_s(text: str) -> float:
+    units = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+    return float(sum(int(n) * units[u] for n, u in _DURATION.findall(text)))
+
+
+def _mm_to_grams(mm: float) -> float:
+    return mm * FILAMENT_AREA_MM2 / 1000.0 * FILAMENT_DENSITY_G_CM3
+
+
+def _read_edges(path: str) -> str:
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        head = fh.read(HEAD_BYTES)
+        if size > HEAD_BYTES + TAIL_BYTES:
+            fh.seek(size - TAIL_BYTES)
+        tail = fh.read()
+    return (head + b"\n" + tail).decode("utf-8", "ignore")
+
+
+def _analyze_gcode(path: str) -> Optional[dict]:
+    text = _read_edges(path)
+
+    weight = None
+    for pattern in _WEIGHT_PATTERNS:
+        m = pattern.search(text)
+        if m:
+            weight = sum(float(v) for v in m.group(1).replace(" ", "").split(",") if v)
+            break
+    if weight is None:
+        m = _CURA_FILAMENT_M.search(text)
+        if m:
+            weight = _mm_to_grams(float(m.group(1)) * 1000)
+
+    seconds = None
+    for pattern in _TIME_PATTERNS:
+        m = pattern.search(text)
+        if m:
+            seconds = _duration_s(m.group(1))
+            break
+    if seconds is None:
+        m = _CURA_TIME.search(text)
+        if m:
+            seconds = float(m.group(1))
+
+    if weight is None or seconds is None:
+        # sin metadatos del slicer: estimar desde los movimientos
+        with open(path, "rb") as fh:
+            index = parse_index(fh)
+        if weight is None:
+            weight = _mm_to_grams(index.total_extrusion)
+        if seconds is None:
+            seconds = index.total_time
+
+    return dict(weight_grams=int(round(weight)), print_time_hours=round(seconds / 3600.0, 2), objects=1)
+
+
+def _analyze_3mf(path: str) -> Optional[dict]:
+    # solo 3MF ya laminados (Bambu/Orca): Metadata/slice_info.config
+    with zipfile.ZipFile(path) as zf:
+        try:
+            root = ET.fromstring(zf.read("Metadata/slice_info.config"))
+        except KeyError:
+            return None
+
+    seconds = weight = 0.0
+    objects = 0
+    for plate in root.iter("plate"):
+        meta = {m.get("key"): m.get("value") for m in plate.findall("metadata")}
+        seconds += float(meta.get("prediction") or 0)
+        weight += float(meta.get("weight") or 0)
+        objects += len(plate.findall("object"))
+    if not seconds and not weight:
+        return None
+    return dict(weight_grams=int(round(weight)), print_time_hours=round(seconds / 3600.0, 2), objects=max(objects, 1))
+
+
+def analyze_file(path: str) -> Optional[dict]:
+    try:
+        if path.lower().endswith(".3mf"):
+            return _analyze_3mf(path)
+        return _analyze_gcode(path)
+    except (OSError, ValueError, zipfile.BadZipFile, ET.ParseError) as e:
+        log.warning("No se pudo analizar %s: %s", path, e)
+        return None
+
+
+def _stat(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class FolderWatcher:
+    def __init__(self, folders: list, session_factory=SessionLocal, settle_s: float = SETTLE_S,
+                 poll_s: float = POLL_S, workers: Optional[int] = None):
+        self.folders = [os.path.abspath(f) for f in folders]
+        self.session_factory = session_factory
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.workers = workers
+        self.known = {}          # path -> (size, mtime_ns) ya indexado
+        self.candidates = {}     # path -> (size, mtime_ns, ultimo cambio)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def load_cursor(self):
+        with self.session_factory() as session:
+            self.known = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in session.query(WatchedFile.path, WatchedFile.size, WatchedFile.mtime_ns)
+            }
+
+    def note(self, path: str):
+        if not path.lower().endswith(EXTENSIONS):
+            return
+        stat = _stat(path)
+        if stat is None or self.known.get(path) == stat:
+            return
+        current = self.candidates.get(path)
+        if current is None or current[:2] != stat:
+            self.candidates[path] = (*stat, time.monotonic())
+
+    def scan(self, folder: Optional[str] = None):
+        for base in ([folder] if folder else self.folders):
+            for root, _dirs, files in os.walk(base):
+                for name in files:
+                    self.note(os.path.join(root, name))
+
+    def ready(self) -> list:
+        # archivos que no han cambiado durante `settle_s` (ya no se estan escribiendo)
+        now = time.monotonic()
+        out = []
+        for path, (size, mtime_ns, changed) in list(self.candidates.items()):
+            stat = _stat(path)
+            if stat is None:
+                del self.candidates[path]
+            elif stat != (size, mtime_ns):
+                self.candidates[path] = (*stat, now)
+            elif now - changed >= self.settle_s:
+                out.append(path)
+                del self.candidates[path]
+        return out
+
+    def store(self, session, paths: list, results: list):
+        params = get_cost_parameters_and_profit_margin(session)
+        objects = {o.gcode_path: o for o in session.query(Object3D).filter(Object3D.gcode_path.in_(paths))}
+        cursor = {w.path: w for w in session.query(WatchedFile).filter(WatchedFile.path.in_(paths))}
+        linked = []
+
+        for path, info in zip(paths, results):
+            stat = _stat(path)
+            if stat is None:
+                continue
+
+            obj = objects.get(path)
+            if info is not None:
+                if obj is None:
+                    obj = Object3D(
+                        name=os.path.splitext(os.path.basename(path))[0],
+                        stl_path=path if path.lower().endswith(".3mf") else "",
+                        gcode_path=path,
+                    )
+                    session.add(obj)
+                    objects[path] = obj
+                obj.objects = info["objects"]
+                obj.weight_grams = info["weight_grams"]
+                obj.print_time_hours = info["print_time_hours"]
+                obj.cost, obj.suggested_price = compute_cost(obj.weight_grams, obj.print_time_hours, obj.objects, params)
+                if obj.gcode_hash or obj.stl_hash:
+                    # guardado tambien en el almacen de assets: el indice de
+                    # G-code y las miniaturas leen del asset, que debe ser el
+                    # archivo re-laminado
+                    attach_object_files(session, obj)
+
+            entry = cursor.get(path)
+            if entry is None:
+                entry = WatchedFile(path=path)
+                session.add(entry)
+            entry.size, entry.mtime_ns = stat
+            entry.indexed_at = datetime.utcnow()
+            linked.append((entry, obj))
+
+        session.flush()
+        for entry, obj in linked:
+            if obj is not None:
+                entry.object_id = obj.id
+        session.commit()
+
+        for entry, _obj in linked:
+            self.known[entry.path] = (entry.size, entry.mtime_ns)
+
+    def process(self, paths: list, pool: ProcessPoolExecutor):
+        for start in range(0, len(paths), BATCH_SIZE):
+            batch = paths[start:start + BATCH_SIZE]
+            results = list(pool.map(analyze_file, batch, chunksize=8))
+            with self.session_factory() as session:
+                self.store(session, batch, results)
+            log.info("%d archivos indexados", len(batch))
+
+    def _open_inotify(self):
+        if INotify is None:
+            return None, {}
+        try:
+            ino = INotify()
+        except OSError:
+            return None, {}
+        watches = {}
+        for folder in self.folders:
+            self._watch_tree(ino, watches, folder)
+        return ino, watches
+
+    def _watch_tree(self, ino, watches: dict, folder: str):
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+        for root, _dirs, _files in os.walk(folder):
+            watches[ino.add_watch(root, mask)] = root
+
+    def run(self):
+        self.load_cursor()
+        self.scan()
+        ino, watches = self._open_inotify()
+        last_scan = time.monotonic()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop_event.is_set():
+                if ino is not None:
+                    for event in ino.read(timeout=int(self.settle_s * 1000 / 2)):
+                        if event.mask & flags.Q_OVERFLOW:
+                            self.scan()
+                            continue
+                        path = os.path.join(watches.get(event.wd, ""), event.name)
+                        if event.mask & flags.ISDIR:
+                            if event.mask & flags.CREATE:
+                                self._watch_tree(ino, watches, path)
+                                self.scan(path)
+                        else:
+                            self.note(path)
+                else:
+                    if time.monotonic() - last_scan >= self.poll_s:
+                        self.scan()
+                        last_scan = time.monotonic()
+                    self._stop_event.wait(min(self.settle_s / 2, self.poll_s))
+
+                paths = self.ready()
+                if paths:
+                    self.process(paths, pool)
+
+        if ino is not None:
+            ino.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Uso: python -m services.watch_folder CARPETA [CARPETA ...]")
+        return 2
+    logging.basicConfig(level=logging.INFO)
+    watcher = FolderWatcher(argv)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,7 +15,12 @@ from PySide6.QtWidgets import (
     QHeaderView,
     QDoubleSpinBox
 )
+from PySide6.QtGui import QColor
+from sqlalchemy.orm.exc import StaleDataError
 from models import Filament
+from services.forecasting import ConsumptionForecast
+from services.readers import filament_rows
+from ui.table_utils import fill_table
 
 def info(msg: str, parent=None):
     QMessageBox.information(parent, "Información", msg)
@@ -90,6 +95,7 @@ class FilamentTab(QWidget):
     def __init__(self):
         super().__init__()
         self.session = SessionLocal()
+        self.forecast = ConsumptionForecast()
 
         layout = QVBoxLayout(self)
 
@@ -104,8 +110,8 @@ class FilamentTab(QWidget):
         controls.addWidget(b_del)
         layout.addLayout(controls)
 
-        self.table = QTableWidget(0, 8)
-        self.table.setHorizontalHeaderLabels(["ID","Nombre","Color","Material","Precio","Gramos Iniciales","Gramos Restantes Efectivos", "Gramos Restantes Proyectados"])
+        self.table = QTableWidget(0, 11)
+        self.table.setHorizontalHeaderLabels(["ID","Nombre","Color","Material","Precio","Gramos Iniciales","Gramos Restantes Efectivos", "Gramos Restantes Proyectados", "Consumo Diario (g)", "Agotamiento Estimado", "Punto de Pedido (g)"])
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.header = self.table.horizontalHeader()
@@ -127,36 +133,30 @@ class FilamentTab(QWidget):
         return int(self.table.item(row, 0).text())
     
     def load_filaments(self):
-        self.table.setRowCount(0)
-        filaments = self.session.query(Filament).all()
-        self.table.setRowCount(len(filaments))
-        for r, it in enumerate(filaments):
-            self.table.setItem(r, 0, QTableWidgetItem(str(it.id)))
-            self.table.setItem(r, 1, QTableWidgetItem(it.name))
-            self.table.setItem(r, 2, QTableWidgetItem(it.color))
-            self.table.setItem(r, 3, QTableWidgetItem(it.material))
-            self.table.setItem(r, 4, QTableWidgetItem(f"{it.price}"))
-            self.table.setItem(r, 5, QTableWidgetItem(f"{it.initial_g}"))
-            self.table.setItem(r, 6, QTableWidgetItem(f"{it.remaining_g_effective}"))
-            self.table.setItem(r, 7, QTableWidgetItem(f"{it.remaining_g_projected}"))
+        self.populate()
+
+    def populate(self, text: str = ""):
+        raw, rows = filament_rows(self.session, text)
+        forecasts = self.forecast.forecast(self.session, raw)
+        fill_table(self.table, rows)
+        for r, it in enumerate(raw):
+            self.set_forecast_cells(r, forecasts.get(it.id))
+
+    def set_forecast_cells(self, r, fc):
+        if fc is None:
+            return
+        self.table.setItem(r, 8, QTableWidgetItem(f"{fc.daily_g:.1f}"))
+        self.table.setItem(r, 9, QTableWidgetItem(fc.runout.isoformat() if fc.runout else "-"))
+        reorder_item = QTableWidgetItem(f"{fc.reorder_point_g:.0f}")
+
+        # Marcar los rollos que ya deberian pedirse
+        if fc.reorder_now:
+            reorder_item.setBackground(QColor("orange"))
+
+        self.table.setItem(r, 10, reorder_item)
 
     def refresh(self):
-        text = (self.search.text() or "").lower()
-        with self.session as s:
-            q = s.query(Filament)
-            items = q.all()
-        if text:
-            items = [i for i in items if (text in (i.name or "").lower()) or (text in (i.color or "").lower()) or (text in (i.material or "").lower())]
-        self.table.setRowCount(len(items))
-        for r, it in enumerate(items):
-            self.table.setItem(r, 0, QTableWidgetItem(str(it.id)))
-            self.table.setItem(r, 1, QTableWidgetItem(it.name))
-            self.table.setItem(r, 2, QTableWidgetItem(it.color))
-            self.table.setItem(r, 3, QTableWidgetItem(it.material))
-            self.table.setItem(r, 4, QTableWidgetItem(f"{it.price}"))
-            self.table.setItem(r, 5, QTableWidgetItem(f"{it.initial_g}"))
-            self.table.setItem(r, 6, QTableWidgetItem(f"{it.remaining_g_effective}"))
-            self.table.setItem(r, 7, QTableWidgetItem(f"{it.remaining_g_projected}"))
+        self.populate((self.search.text() or "").strip())
 
     def add_item(self):
         dlg = FilamentDialog(self)
@@ -189,7 +189,11 @@ class FilamentTab(QWidget):
                     error(str(e), self); return
                 for k, v in values.items():
                     setattr(obj, k, v)
-                s.commit()
+                try:
+                    s.commit()
+                except StaleDataError:
+                    s.rollback()
+                    error("El filamento fue modificado por otro proceso; vuelve a intentarlo", self)
         self.refresh()
 
     def delete_item(self):
@@ -3,6 +3,7 @@ from ui.objects_tab import ObjectsTab
 from ui.queue_tab import QueueTab
 from ui.printer_tab import PrinterTab
 from ui.filament_tab import FilamentTab
+from ui.timeline_tab import TimelineTab
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -12,13 +13,16 @@ class MainWindow(QMainWindow):
 
         self.filament_tab = FilamentTab()
         self.queue_tab = QueueTab()
+        self.timeline_tab = TimelineTab()
 
         tabs = QTabWidget()
         tabs.addTab(self.filament_tab, "Filamentos")
         tabs.addTab(PrinterTab(), "Impresoras")
         tabs.addTab(ObjectsTab(), "Objetos")
         tabs.addTab(self.queue_tab, "Cola de impresión")
+        tabs.addTab(self.timeline_tab, "Calendario")
 
         self.queue_tab.job_created.connect(self.filament_tab.load_filaments)
+        self.queue_tab.job_created.connect(self.timeline_tab.mark_dirty)
 
         self.setCentralWidget(tabs)
\ No newline at end of file
@@ -1,6 +1,17 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QLineEdit, QFormLayout, QDoubleSpinBox, QHeaderView, QMessageBox, QDialog, QCheckBox, QHBoxLayout
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QTableWidget, QLineEdit, QFormLayout, QDoubleSpinBox, QHeaderView, QMessageBox, QDialog, QCheckBox, QHBoxLayout, QLabel
+from PySide6.QtGui import QPixmap
+from PySide6.QtCore import Qt, Signal, QTimer
 from database import SessionLocal
-from models import Object3D, GlobalConfig, Filament, Printer
+from models import Object3D, GlobalConfig
+from services.asset_store import attach_object_files, duplicates_of
+from services.readers import object_rows
+from services.costing import get_cost_parameters_and_profit_margin, compute_cost
+from services.thumbnails import request_thumbnail, THUMB_SIZE
+from ui.table_utils import fill_table
+
+# espera antes de pedir la vista previa: al recorrer la tabla con el teclado
+# solo se renderiza la fila en la que el usuario se detiene
+PREVIEW_DELAY_MS = 150
 
 class ConfigDialog(QDialog):
     def __init__(self, session):
@@ -46,10 +57,18 @@ class ConfigDialog(QDialog):
         self.accept()
 
 class ObjectsTab(QWidget):
+    preview_ready = Signal(int, str)
+
     def __init__(self):
         super().__init__()
         self.session = SessionLocal()
         self.selected_id = None
+        self.preview_id = None
+        self.preview_future = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self._request_preview)
 
         layout = QVBoxLayout()
 
@@ -77,7 +96,17 @@ class ObjectsTab(QWidget):
         form.addRow("Objetos en el archivo:", self.objects_input)
         form.addRow("Peso (g):", self.weight_input)
         form.addRow("Tiempo de impresión (h):", self.time_input)
-        layout.addLayout(form)
+
+        # Vista previa del modelo (se genera en segundo plano)
+        self.preview = QLabel("Sin vista previa")
+        self.preview.setFixedSize(THUMB_SIZE, THUMB_SIZE)
+        self.preview.setAlignment(Qt.AlignCenter)
+        self.preview_ready.connect(self.set_preview)
+
+        top = QHBoxLayout()
+        top.addLayout(form, 1)
+        top.addWidget(self.preview)
+        layout.addLayout(top)
 
         # Botones
         self.add_btn = QPushButton("Agregar Objeto")
@@ -107,28 +136,7 @@ class ObjectsTab(QWidget):
         layout.addLayout(bottom_layout)
 
     def get_cost_parameters_and_profit_margin(self):
-        config = self.session.query(GlobalConfig).first()
-        if not config:
-            config = GlobalConfig()
-            self.session.add(config)
-            self.session.commit()
-
-        if config.use_manual:
-            return (
-                config.manual_filament_cost or 0,
-                config.manual_energy_cost or 0,
-                config.manual_printer_cost or 0,
-                config.manual_profit_margin or 0
-            )
-
-        filaments = self.session.query(Filament).all()
-        printers = self.session.query(Printer).all()
-
-        costo_gramo = sum(f.price/f.initial_g for f in filaments)/len(filaments) if filaments else 0
-        costo_kwh = (sum(p.power_kwh_per_hour for p in printers)/len(printers))*config.electricity_cost_kwh if printers else config.electricity_cost_kwh
-        costo_desgaste = sum(p.wear_per_hour for p in printers)/len(printers) if printers else 0
-
-        return (costo_gramo, costo_kwh, costo_desgaste, config.profit_margin)
+        return get_cost_parameters_and_profit_margin(self.session)
 
     def on_row_selected(self, row, col):
         self.update_btn.setEnabled(True)
@@ -170,6 +178,46 @@ class ObjectsTab(QWidget):
             self.add_btn.setEnabled(False)
             self.update_btn.setEnabled(True)
             self.delete_btn.setEnabled(True)
+            self.show_preview(int(self.table.item(selected[0].row(), 0).text()))
+
+    def show_preview(self, obj_id):
+        self._cancel_preview()
+        self.preview_id = obj_id
+        self.preview.setPixmap(QPixmap())
+        self.preview.setText("Generando vista previa…")
+        self.preview_timer.start()
+
+    def _cancel_preview(self):
+        # el render pedido para otra fila ya no sirve: si aun no empezo, se
+        # quita de la cola del pool
+        self.preview_timer.stop()
+        if self.preview_future is not None:
+            self.preview_future.cancel()
+            self.preview_future = None
+
+    def _request_preview(self):
+        obj_id = self.preview_id
+        obj = self.session.get(Object3D, obj_id) if obj_id is not None else None
+        if obj is None or not (obj.stl_path or obj.stl_hash):
+            self.preview.setText("Sin vista previa")
+            return
+        self.preview_future = request_thumbnail(obj)
+        self.preview_future.add_done_callback(lambda f, oid=obj_id: self._preview_done(oid, f))
+
+    def _preview_done(self, obj_id, future):
+        # corre en otro hilo: la señal lleva el resultado al hilo de la interfaz
+        if future.cancelled():
+            return
+        self.preview_ready.emit(obj_id, "" if future.exception() else (future.result() or ""))
+
+    def set_preview(self, obj_id, path):
+        if obj_id != self.preview_id:
+            return
+        self.preview_future = None
+        if path:
+            self.preview.setPixmap(QPixmap(path))
+        else:
+            self.preview.setText("Sin vista previa")
 
     def add_object(self):
 
@@ -184,32 +232,25 @@ class ObjectsTab(QWidget):
             print_time_hours=float(self.time_input.value())
         )
 
-        costo_gramo, costo_kwh, costo_desgaste, profit_margin = self.get_cost_parameters_and_profit_margin()
-        cost = int((obj.weight_grams * costo_gramo + obj.print_time_hours * costo_kwh + obj.print_time_hours * costo_desgaste) / q)
-        obj.cost = (cost)
-
-        suggested_price = int(cost * ((profit_margin / 100.0) + 1))
-        obj.suggested_price = (suggested_price)
+        obj.cost, obj.suggested_price = compute_cost(
+            obj.weight_grams, obj.print_time_hours, q, self.get_cost_parameters_and_profit_margin()
+        )
 
         self.session.add(obj)
+        attach_object_files(self.session, obj)
         self.session.commit()
+        self.warn_duplicates(obj)
         self.load_objects()
         self.clear_form()
 
+    def warn_duplicates(self, obj):
+        dupes = duplicates_of(self.session, obj)
+        if dupes:
+            names = ", ".join(d.name for d in dupes[:5])
+            QMessageBox.information(self, "Archivo duplicado", f"El modelo o Gcode ya existe en: {names}")
+
     def load_objects(self):
-        self.table.setRowCount(0)
-        objects = self.session.query(Object3D).all()
-        for row_idx, obj in enumerate(objects):
-            self.table.insertRow(row_idx)
-            self.table.setItem(row_idx, 0, QTableWidgetItem(str(obj.id)))
-            self.table.setItem(row_idx, 1, QTableWidgetItem(obj.name))
-            self.table.setItem(row_idx, 2, QTableWidgetItem(obj.stl_path))
-            self.table.setItem(row_idx, 3, QTableWidgetItem(obj.gcode_path))
-            self.table.setItem(row_idx, 4, QTableWidgetItem(str(obj.objects)))
-            self.table.setItem(row_idx, 5, QTableWidgetItem(str(obj.weight_grams)))
-            self.table.setItem(row_idx, 6, QTableWidgetItem(str(obj.print_time_hours)))
-            self.table.setItem(row_idx, 7, QTableWidgetItem(str(obj.cost)))
-            self.table.setItem(row_idx, 8, QTableWidgetItem(str(obj.suggested_price)))
+        fill_table(self.table, object_rows(self.session))
 
     def update_object(self):
         new_data = {
@@ -246,18 +287,11 @@ class ObjectsTab(QWidget):
             obj.weight_grams = w
             obj.print_time_hours = h
 
-            costo_gramo, costo_kwh, costo_desgaste, profit_margin = self.get_cost_parameters_and_profit_margin()
-            cost = int(
-                (w * costo_gramo +
-                h * costo_kwh +
-                h * costo_desgaste) / q
-            )
-            obj.cost = (cost)
-
-            suggested_price = int(cost * ((profit_margin / 100.0) + 1))
-            obj.suggested_price = (suggested_price)
+            obj.cost, obj.suggested_price = compute_cost(w, h, q, self.get_cost_parameters_and_profit_margin())
 
+            attach_object_files(self.session, obj)
             self.session.commit()
+            self.warn_duplicates(obj)
             self.load_objects()
             self.clear_form()
             QMessageBox.information(self, "Éxito", "Objeto actualizado correctamente.")
@@ -284,6 +318,10 @@ class ObjectsTab(QWidget):
 
     def clear_form(self):
         self.selected_id = None
+        self._cancel_preview()
+        self.preview_id = None
+        self.preview.setPixmap(QPixmap())
+        self.preview.setText("Sin vista previa")
         self.name_input.clear()
         self.model_input.clear()
         self.gcode_input.clear()
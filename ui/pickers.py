@@ -0,0 +1,152 @@
+from typing import Optional
+
+from PySide6.QtWidgets import QComboBox, QCompleter
+from PySide6.QtCore import Qt, QAbstractListModel, QAbstractTableModel, QModelIndex
+
+from services.reference_data import Catalog
+
+# Selectores sobre un Catalog (services.reference_data). Los modelos leen del
+# catalogo bajo demanda, asi que abrir un combo con 100k elementos no crea
+# ningun item; el autocompletado busca el prefijo con bisect y muestra solo
+# las primeras COMPLETION_ROWS coincidencias.
+
+COMPLETION_ROWS = 200
+
+
+class CatalogModel(QAbstractListModel):
+    def __init__(self, catalog: Catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.catalog)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.catalog.labels[index.row()]
+        if role == Qt.UserRole:
+            return self.catalog.ids[index.row()]
+        return None
+
+
+class QuantityModel(QAbstractTableModel):
+    # catalogo con una columna de cantidad editable; solo se guardan las
+    # cantidades cambiadas (por fila), el resto vale `default`
+    HEADERS = ("Objeto", "Cantidad")
+
+    def __init__(self, catalog: Catalog, default: int = 1, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.default = default
+        self.quantities = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.catalog)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        return flags | Qt.ItemIsEditable if index.column() == 1 else flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if index.column() == 0:
+                return self.catalog.labels[row]
+            return self.quantity(row)
+        if role == Qt.UserRole:
+            return self.catalog.ids[row]
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != 1:
+            return False
+        try:
+            quantity = int(value)
+        except (TypeError, ValueError):
+            return False
+        if quantity < 1:
+            return False
+        self.quantities[index.row()] = quantity
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def quantity(self, row: int) -> int:
+        return self.quantities.get(row, self.default)
+
+
+class PrefixModel(QAbstractListModel):
+    # ventana [lo, hi) del catalogo que empieza por el texto escrito
+    def __init__(self, catalog: Catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.lo = self.hi = 0
+
+    def set_prefix(self, text: str):
+        self.beginResetModel()
+        self.lo, self.hi = self.catalog.prefix_range(text)
+        self.hi = min(self.hi, self.lo + COMPLETION_ROWS)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.hi - self.lo
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.catalog.labels[self.lo + index.row()]
+        return None
+
+
+class CatalogPicker(QComboBox):
+    def __init__(self, catalog: Catalog, parent=None):
+        super().__init__(parent)
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        # no recorrer todos los elementos para calcular el ancho
+        self.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.setMinimumContentsLength(30)
+        self.setMaxVisibleItems(20)
+
+        self.catalog = catalog
+        self.setModel(CatalogModel(catalog, self))
+        self.view().setUniformItemSizes(True)
+
+        # el completer por defecto del combo filtra recorriendo todo el modelo;
+        # se reemplaza por uno sobre la ventana del prefijo
+        self.setCompleter(None)
+        self.prefix_model = PrefixModel(catalog, self)
+        completer = QCompleter(self.prefix_model, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setMaxVisibleItems(15)
+        completer.activated[QModelIndex].connect(self._completed)
+        self.lineEdit().setCompleter(completer)
+
+        self.lineEdit().textEdited.connect(self._text_edited)
+
+    def _text_edited(self, text: str):
+        self.prefix_model.set_prefix(text)
+        if text:
+            self.lineEdit().completer().complete()
+
+    def _completed(self, index: QModelIndex):
+        self.setCurrentIndex(self.prefix_model.lo + index.row())
+
+    def current_id(self) -> Optional[int]:
+        # el texto manda: si se escribio algo que no esta en el catalogo, None
+        return self.catalog.find(self.currentText())
+
+    def select_id(self, id_: int):
+        self.setCurrentIndex(self.catalog.position(id_))
@@ -8,14 +8,16 @@ from PySide6.QtWidgets import (
     QLineEdit,
     QPushButton,
     QTableWidget,
-    QTableWidgetItem,
     QMessageBox,
     QDialog,
     QDoubleSpinBox,
+    QComboBox,
     QFormLayout,
     QHeaderView
 )
 from models import Printer
+from services.readers import printer_rows
+from ui.table_utils import fill_table
 
 def info(msg: str, parent=None):
     QMessageBox.information(parent, "Información", msg)
@@ -34,11 +36,17 @@ class PrinterDialog(QDialog):
         self.e_price = QDoubleSpinBox(); self.e_price.setDecimals(0); self.e_price.setMaximum(1e7)
         self.e_wear = QDoubleSpinBox(); self.e_wear.setMaximum(1e5); self.e_wear.setDecimals(2)
         self.e_power = QDoubleSpinBox(); self.e_power.setMaximum(1e5); self.e_power.setDecimals(2)
+        self.e_api_type = QComboBox(); self.e_api_type.addItems(["", "octoprint", "moonraker"])
+        self.e_api_url = QLineEdit(); self.e_api_url.setPlaceholderText("http://192.168.1.50")
+        self.e_api_key = QLineEdit()
 
         layout.addRow("Nombre*", self.e_name)
         layout.addRow("Precio compra*", self.e_price)
         layout.addRow("Desgaste/hora*", self.e_wear)
         layout.addRow("kWh por hora*", self.e_power)
+        layout.addRow("Tipo de API", self.e_api_type)
+        layout.addRow("URL de API", self.e_api_url)
+        layout.addRow("API key", self.e_api_key)
 
         btns = QHBoxLayout()
         b_ok = QPushButton("Guardar")
@@ -55,6 +63,9 @@ class PrinterDialog(QDialog):
             self.e_price.setValue(data.price)
             self.e_wear.setValue(data.wear_per_hour)
             self.e_power.setValue(data.power_kwh_per_hour)
+            self.e_api_type.setCurrentText(data.api_type or "")
+            self.e_api_url.setText(data.api_url or "")
+            self.e_api_key.setText(data.api_key or "")
 
     def get_values(self) -> dict:
         name = self.e_name.text().strip()
@@ -67,7 +78,10 @@ class PrinterDialog(QDialog):
             name=name,
             price=price,
             wear_per_hour=wear,
-            power_kwh_per_hour=power
+            power_kwh_per_hour=power,
+            api_type=self.e_api_type.currentText() or None,
+            api_url=self.e_api_url.text().strip() or None,
+            api_key=self.e_api_key.text().strip() or None
         )
 
 class PrinterTab(QWidget):
@@ -111,18 +125,8 @@ class PrinterTab(QWidget):
         return int(self.table.item(row, 0).text())
 
     def refresh(self):
-        text = (self.search.text() or "").lower()
-        with self.session as s:
-            items = s.query(Printer).all()
-        if text:
-            items = [i for i in items if text in (i.name or "").lower()]
-        self.table.setRowCount(len(items))
-        for r, it in enumerate(items):
-            self.table.setItem(r, 0, QTableWidgetItem(str(it.id)))
-            self.table.setItem(r, 1, QTableWidgetItem(it.name))
-            self.table.setItem(r, 2, QTableWidgetItem(f"{it.price}"))
-            self.table.setItem(r, 3, QTableWidgetItem(f"{it.wear_per_hour:.2f}"))
-            self.table.setItem(r, 4, QTableWidgetItem(f"{it.power_kwh_per_hour:.2f}"))
+        text = (self.search.text() or "").strip()
+        fill_table(self.table, printer_rows(self.session, text))
 
     def add_item(self):
         dlg = PrinterDialog(self)
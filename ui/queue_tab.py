@@ -1,13 +1,26 @@
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QPushButton, QTableWidget, 
-    QTableWidgetItem, QHeaderView, QDialog, QFormLayout, 
-    QComboBox, QDialogButtonBox, QDoubleSpinBox
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget,
+    QHeaderView, QDialog, QFormLayout, QAbstractItemView,
+    QComboBox, QDialogButtonBox, QDoubleSpinBox, QSpinBox, QMessageBox, QFileDialog, QTableView
 )
 from PySide6.QtGui import QColor
 from PySide6.QtCore import Signal, QObject
 from database import SessionLocal
 from models import PrintJob, Object3D, Filament, Printer
-from datetime import datetime
+from services.queue_ops import enqueue_job, process_job_by_id
+from services.reservations import with_retry, InsufficientFilament, ConcurrentUpdate
+from services.bulk_enqueue import OrderLine, OrderError, enqueue_many, import_order_csv
+from services.readers import queue_rows
+from services.reference_data import catalogs
+from ui.table_utils import fill_table
+from ui.pickers import CatalogPicker, QuantityModel
+
+ACTION_CODES = {
+    "Terminado": "done",
+    "Imprimiendo": "printing",
+    "Cancelado": "cancelled",
+    "Eliminado": "deleted",
+}
 
 class AddJobDialog(QDialog):
     def __init__(self, session, parent=None):
@@ -17,22 +30,15 @@ class AddJobDialog(QDialog):
 
         layout = QFormLayout()
 
-        self.obj_combo = QComboBox()
-        self.objects = self.session.query(Object3D).all()
-        for obj in self.objects:
-            self.obj_combo.addItem(obj.name, obj.id)
+        objects, filaments, printers = catalogs.get_all(session, "objects", "filaments", "printers")
+
+        self.obj_combo = CatalogPicker(objects)
         layout.addRow("Objeto:", self.obj_combo)
 
-        self.filament_combo = QComboBox()
-        self.filaments = self.session.query(Filament).all()
-        for f in self.filaments:
-            self.filament_combo.addItem(f.name, f.id)
+        self.filament_combo = CatalogPicker(filaments)
         layout.addRow("Filamento:", self.filament_combo)
 
-        self.printer_combo = QComboBox()
-        self.printers = self.session.query(Printer).all()
-        for p in self.printers:
-            self.printer_combo.addItem(p.name, p.id)
+        self.printer_combo = CatalogPicker(printers)
         layout.addRow("Impresora:", self.printer_combo)
 
         self.quantity_spinbox = QDoubleSpinBox(); self.quantity_spinbox.setDecimals(0); self.quantity_spinbox.setMaximum(1e2)
@@ -46,17 +52,56 @@ class AddJobDialog(QDialog):
         self.setLayout(layout)
 
     def get_selection(self):
-        obj_id = self.obj_combo.currentData()
-        filament_id = self.filament_combo.currentData()
-        printer_id = self.printer_combo.currentData()
+        obj_id = self.obj_combo.current_id()
+        filament_id = self.filament_combo.current_id()
+        printer_id = self.printer_combo.current_id()
         quantity = int(self.quantity_spinbox.value())
 
-        obj = self.session.query(Object3D).get(obj_id)
-        filament = self.session.query(Filament).get(filament_id)
-        printer = self.session.query(Printer).get(printer_id)
+        obj = self.session.get(Object3D, obj_id) if obj_id is not None else None
+        filament = self.session.get(Filament, filament_id) if filament_id is not None else None
+        printer = self.session.get(Printer, printer_id) if printer_id is not None else None
 
         return obj, filament, printer, quantity
-    
+
+class BulkAddJobDialog(QDialog):
+    def __init__(self, session, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Agregar varios a la cola")
+        self.resize(520, 480)
+        layout = QFormLayout()
+
+        objects, filaments, printers = catalogs.get_all(session, "objects", "filaments", "printers")
+        # modelo sobre el catalogo: no se crea un item por objeto
+        self.model = QuantityModel(objects, parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().hide()
+        layout.addRow(self.table)
+
+        self.filament_combo = CatalogPicker(filaments)
+        layout.addRow("Filamento:", self.filament_combo)
+
+        self.printer_combo = CatalogPicker(printers)
+        layout.addRow("Impresora:", self.printer_combo)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.setLayout(layout)
+
+    def get_lines(self):
+        filament_id = self.filament_combo.current_id()
+        printer_id = self.printer_combo.current_id()
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        ids = self.model.catalog.ids
+        return [OrderLine(ids[row], filament_id, printer_id, self.model.quantity(row), row + 1) for row in rows]
+
 class ProcessJobDialog(QDialog):
     def __init__(self, job, parent=None):
         super().__init__(parent)
@@ -75,9 +120,18 @@ class ProcessJobDialog(QDialog):
         self.partial_time.setEnabled(False)
         layout.addRow("Tiempo impreso (h):", self.partial_time)
 
+        # 0 = usar solo el tiempo impreso
+        self.partial_layer = QSpinBox()
+        self.partial_layer.setMaximum(100000)
+        self.partial_layer.setEnabled(False)
+        layout.addRow("Capas completas:", self.partial_layer)
+
         self.action_combo.currentTextChanged.connect(
             lambda text: self.partial_time.setEnabled(text == "Cancelado")
         )
+        self.action_combo.currentTextChanged.connect(
+            lambda text: self.partial_layer.setEnabled(text == "Cancelado")
+        )
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
@@ -87,7 +141,7 @@ class ProcessJobDialog(QDialog):
         self.setLayout(layout)
 
     def get_action(self):
-        return self.action_combo.currentText(), self.partial_time.value()
+        return self.action_combo.currentText(), self.partial_time.value(), self.partial_layer.value()
 
 class QueueTab(QWidget):
     job_created = Signal(str)
@@ -106,9 +160,17 @@ class QueueTab(QWidget):
         self.table.itemSelectionChanged.connect(self.on_selection_changed)
         layout.addWidget(self.table)
 
+        add_row = QHBoxLayout()
         add_btn = QPushButton("Agregar a Cola")
         add_btn.clicked.connect(self.add_job)
-        layout.addWidget(add_btn)
+        add_row.addWidget(add_btn)
+        bulk_btn = QPushButton("Agregar varios…")
+        bulk_btn.clicked.connect(self.add_jobs)
+        add_row.addWidget(bulk_btn)
+        import_btn = QPushButton("Importar pedido CSV…")
+        import_btn.clicked.connect(self.import_order)
+        add_row.addWidget(import_btn)
+        layout.addLayout(add_row)
 
         self.process_btn = QPushButton("Procesar Trabajo")
         self.process_btn.clicked.connect(self.process_queue)
@@ -119,24 +181,17 @@ class QueueTab(QWidget):
         self.load_jobs()
 
     def load_jobs(self):
-        self.table.setRowCount(0)
-        jobs = self.session.query(PrintJob).filter(PrintJob.status.in_(["pending", "printing"])).all()
-        for row_idx, job in enumerate(jobs):
-            self.table.insertRow(row_idx)
-            self.table.setItem(row_idx, 0, QTableWidgetItem(str(job.id)))
-            self.table.setItem(row_idx, 1, QTableWidgetItem(job.object.name if job.object else "-"))
-            self.table.setItem(row_idx, 2, QTableWidgetItem(job.filament.name if job.filament else "-"))
-            self.table.setItem(row_idx, 3, QTableWidgetItem(str(job.quantity)))
-            status_item = QTableWidgetItem(job.status)
-
-            # Colorear según estado
-            if job.status == "printing":
+        rows = queue_rows(self.session, ["pending", "printing"])
+        fill_table(self.table, rows)
+
+        # Colorear según estado
+        for row_idx, row in enumerate(rows):
+            status_item = self.table.item(row_idx, 4)
+            if row[4] == "printing":
                 status_item.setBackground(QColor("yellow"))
-            elif job.status == "pending":
+            elif row[4] == "pending":
                 status_item.setBackground(QColor("lightgreen"))
 
-            self.table.setItem(row_idx, 4, status_item)
-
     def on_selection_changed(self):
         selected = self.table.selectedItems()
         self.process_btn.setEnabled(bool(selected))
@@ -146,26 +201,49 @@ class QueueTab(QWidget):
         if dialog.exec() == QDialog.Accepted:
             obj, filament, printer, quantity = dialog.get_selection()
             if obj and filament and printer:
+                try:
+                    enqueue_job(self.session, obj, filament, printer, quantity)
+                    self.session.commit()
+                except InsufficientFilament as e:
+                    self.session.rollback()
+                    QMessageBox.warning(self, "Filamento insuficiente", str(e))
+                    return
 
-                total_hours = obj.print_time_hours * quantity
-                total_filament = obj.weight_grams * quantity
+                self.load_jobs()
+                self.job_created.emit("Job Created")
 
-                job = PrintJob(
-                    object=obj,
-                    filament=filament,
-                    printer=printer,
-                    quantity=quantity,
-                    hours=total_hours,
-                    filament_used_g=total_filament,
-                    status="pending"
-                )
-                self.session.add(job)
+    def _enqueue_bulk(self, enqueue, *args):
+        try:
+            count = enqueue(self.session, *args)
+            self.session.commit()
+        except (OrderError, InsufficientFilament) as e:
+            self.session.rollback()
+            QMessageBox.warning(self, "Pedido no agregado", str(e))
+            return
 
-                filament.remaining_g_projected -= total_filament
+        # una sola recarga para todo el pedido
+        self.load_jobs()
+        self.job_created.emit("Jobs Created")
+        QMessageBox.information(self, "Pedido agregado", f"{count} trabajos agregados a la cola")
 
-                self.session.commit()
-                self.load_jobs()
-                self.job_created.emit("Job Created")
+    def add_jobs(self):
+        dialog = BulkAddJobDialog(self.session, self)
+        if dialog.exec() == QDialog.Accepted:
+            lines = dialog.get_lines()
+            if lines:
+                self._enqueue_bulk(enqueue_many, lines)
+
+    def import_order(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Importar pedido", "", "CSV (*.csv);;Todos (*)")
+        if not path:
+            return
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as fh:
+                text = fh.read()
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.warning(self, "Pedido no agregado", str(e))
+            return
+        self._enqueue_bulk(import_order_csv, text)
 
     def process_queue(self):
         selected = self.table.selectedItems()
@@ -175,39 +253,17 @@ class QueueTab(QWidget):
         row = selected[0].row()
         job_id = int(self.table.item(row, 0).text())
         job = self.session.query(PrintJob).get(job_id)
-        filament = job.filament
+        if job is None:
+            self.load_jobs()
+            return
 
         dialog = ProcessJobDialog(job, self)
         if dialog.exec() == QDialog.Accepted:
-            action, partial_time = dialog.get_action()
-
-            if action == "Eliminado":
-                filament.remaining_g_projected += job.filament_used_g
-                self.session.delete(job)
-
-            elif action == "Cancelado":
-                filament.remaining_g_projected += job.filament_used_g
-
-                if partial_time > 0 and job.hours:
-                    ratio = partial_time / job.hours
-                    used = job.filament_used_g * ratio
-
-                    job.hours = partial_time
-                    job.filament_used_g = used
+            action, partial_time, partial_layer = dialog.get_action()
+            try:
+                with_retry(self.session, process_job_by_id, job_id, ACTION_CODES[action], partial_time, partial_layer)
+            except (ValueError, LookupError, ConcurrentUpdate) as e:
+                QMessageBox.warning(self, "No se pudo procesar", str(e))
 
-                    filament.remaining_g_projected -= used
-                    filament.remaining_g_effective -= used
-
-                job.status = "cancelled"
-
-            elif action == "Imprimiendo":
-                job.status = "printing"
-
-            elif action == "Terminado":
-                job.status = "done"
-                job.completed_at = datetime.utcnow()
-                filament.remaining_g_effective -= job.filament_used_g
-
-            self.session.commit()
             self.load_jobs()
-            self.job_created.emit("Job Update")
\ No newline at end of file
+            self.job_created.emit("Job Update")
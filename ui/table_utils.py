@@ -0,0 +1,11 @@
+from PySide6.QtWidgets import QTableWidgetItem
+
+def fill_table(table, rows):
+    # rows: filas ya formateadas como texto (ver services.readers)
+    table.setUpdatesEnabled(False)
+    table.setRowCount(0)
+    table.setRowCount(len(rows))
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            table.setItem(r, c, QTableWidgetItem(value))
+    table.setUpdatesEnabled(True)
@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta
+
+from PySide6.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QPushButton,
+    QComboBox,
+    QLabel,
+    QToolTip,
+)
+from PySide6.QtGui import QPainter, QColor, QPen
+from PySide6.QtCore import Qt, QRectF
+from database import SessionLocal
+from models import Printer, Object3D
+from services.timeline import TimelineIndex, STATUSES, to_epoch, from_epoch
+
+# Diagrama de Gantt de ocupacion por impresora. Solo se dibuja la ventana
+# visible: cada fila pide al indice los trabajos que se solapan con ella.
+
+ZOOMS = {"Día": timedelta(days=1), "Semana": timedelta(days=7), "Mes": timedelta(days=30)}
+STATUS_COLORS = {
+    "pending": QColor("lightgreen"),
+    "printing": QColor("yellow"),
+    "done": QColor("lightsteelblue"),
+    "cancelled": QColor("lightcoral"),
+}
+GUTTER = 170
+ROW_H = 32
+
+
+class TimelineView(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMouseTracking(True)
+        self.setMinimumHeight(200)
+        self.index = TimelineIndex()
+        self.printers = []       # (id, nombre)
+        self.object_names = {}
+        self.start = datetime.utcnow() - timedelta(hours=12)
+        self.span = ZOOMS["Día"]
+        self._drag_x = None
+
+    def set_window(self, start: datetime, span: timedelta):
+        self.start, self.span = start, span
+        self.update()
+
+    def _scale(self) -> float:
+        return max(self.width() - GUTTER, 1) / self.span.total_seconds()
+
+    def _x(self, seconds, t0: int, scale: float) -> float:
+        return GUTTER + (seconds - t0) * scale
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.fillRect(self.rect(), QColor("white"))
+        t0 = to_epoch(self.start)
+        t1 = to_epoch(self.start + self.span)
+        scale = self._scale()
+        width = self.width() - GUTTER
+
+        self._paint_ticks(p, t0, t1, scale)
+
+        for row, (pid, name) in enumerate(self.printers):
+            y = 24 + row * ROW_H
+            if y > self.height():
+                break
+            lane = self.index.lane(pid)
+            util = lane.utilization(t0, t1)
+            p.setPen(QColor("black"))
+            p.drawText(QRectF(4, y, GUTTER - 8, ROW_H), Qt.AlignVCenter, f"{name}  {util:.0%}")
+
+            spans = lane.overlapping(t0, t1)
+            if len(spans) > width // 3:
+                # demasiados trabajos para distinguirlos: bloques ocupados
+                starts, ends = lane.busy_blocks(t0, t1)
+                p.setPen(Qt.NoPen)
+                p.setBrush(QColor("gray"))
+                for s, e in zip(starts, ends):
+                    x0 = max(self._x(s, t0, scale), GUTTER)
+                    x1 = self._x(e, t0, scale)
+                    p.drawRect(QRectF(x0, y + 4, max(x1 - x0, 1), ROW_H - 8))
+                continue
+
+            p.setPen(QPen(QColor("dimgray")))
+            for job, obj, status, s, e in zip(spans.job, spans.object, spans.status, spans.start, spans.end):
+                x0 = max(self._x(s, t0, scale), GUTTER)
+                x1 = self._x(e, t0, scale)
+                rect = QRectF(x0, y + 4, max(x1 - x0, 1), ROW_H - 8)
+                p.setBrush(STATUS_COLORS[STATUSES[status]])
+                p.drawRect(rect)
+                if rect.width() > 40:
+                    p.drawText(rect.adjusted(3, 0, -3, 0), Qt.AlignVCenter, self.object_names.get(int(obj), str(job)))
+
+        now = to_epoch(datetime.utcnow())
+        if t0 <= now <= t1:
+            x = self._x(now, t0, scale)
+            p.setPen(QPen(QColor("red"), 2))
+            p.drawLine(int(x), 20, int(x), self.height())
+        p.end()
+
+    def _paint_ticks(self, p, t0: int, t1: int, scale: float):
+        step = 3600 if self.span <= timedelta(days=1) else 86400
+        fmt = "%H:%M" if step == 3600 else "%d/%m"
+        p.setPen(QColor("lightgray"))
+        tick = t0 - t0 % step + step
+        while tick < t1:
+            x = int(self._x(tick, t0, scale))
+            p.drawLine(x, 18, x, self.height())
+            p.drawText(x + 2, 14, from_epoch(tick).strftime(fmt))
+            tick += step
+
+    def job_at(self, pos):
+        row = int((pos.y() - 24) // ROW_H)
+        if pos.x() < GUTTER or not 0 <= row < len(self.printers):
+            return None
+        t = to_epoch(self.start) + (pos.x() - GUTTER) / self._scale()
+        spans = self.index.lane(self.printers[row][0]).overlapping(int(t), int(t) + 1)
+        if not len(spans):
+            return None
+        return spans, len(spans) - 1
+
+    def mouseMoveEvent(self, event):
+        pos = event.position()
+        if self._drag_x is not None:
+            dx = pos.x() - self._drag_x
+            self._drag_x = pos.x()
+            self.set_window(self.start - timedelta(seconds=dx / self._scale()), self.span)
+            return
+        hit = self.job_at(pos)
+        if hit is None:
+            QToolTip.hideText()
+            return
+        spans, i = hit
+        text = (f"Trabajo {spans.job[i]} - {self.object_names.get(int(spans.object[i]), '')}\n"
+                f"{STATUSES[spans.status[i]]}: {from_epoch(spans.start[i]):%d/%m %H:%M} → {from_epoch(spans.end[i]):%d/%m %H:%M}")
+        QToolTip.showText(event.globalPosition().toPoint(), text, self)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag_x = event.position().x()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_x = None
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if event.modifiers() & Qt.ControlModifier:
+            center = self.start + self.span / 2
+            span = self.span * (0.8 ** steps)
+            span = min(max(span, timedelta(hours=2)), timedelta(days=365))
+            self.set_window(center - span / 2, span)
+        else:
+            self.set_window(self.start - self.span * (steps / 10), self.span)
+
+
+class TimelineTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.session = SessionLocal()
+
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        b_prev = QPushButton("◀")
+        b_today = QPushButton("Hoy")
+        b_next = QPushButton("▶")
+        self.zoom = QComboBox(); self.zoom.addItems(list(ZOOMS))
+        b_refresh = QPushButton("Actualizar")
+        self.next_free = QLabel()
+        controls.addWidget(b_prev)
+        controls.addWidget(b_today)
+        controls.addWidget(b_next)
+        controls.addWidget(self.zoom)
+        controls.addWidget(b_refresh)
+        controls.addWidget(self.next_free, 1)
+        layout.addLayout(controls)
+
+        self.view = TimelineView(self)
+        layout.addWidget(self.view, 1)
+
+        b_prev.clicked.connect(lambda: self.view.set_window(self.view.start - self.view.span, self.view.span))
+        b_next.clicked.connect(lambda: self.view.set_window(self.view.start + self.view.span, self.view.span))
+        b_today.clicked.connect(self.go_today)
+        self.zoom.currentTextChanged.connect(self.go_today)
+        b_refresh.clicked.connect(self.refresh)
+
+        # la cola avisa de cada cambio; se recarga al mostrar la pestaña
+        self.dirty = True
+
+    def mark_dirty(self, *_):
+        self.dirty = True
+        if self.isVisible():
+            self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.refresh()
+
+    def go_today(self):
+        span = ZOOMS[self.zoom.currentText()]
+        self.view.set_window(datetime.utcnow() - span / 4, span)
+
+    def refresh(self, *_):
+        self.dirty = False
+        with self.session as s:
+            self.view.printers = s.query(Printer.id, Printer.name).order_by(Printer.id).all()
+            self.view.object_names = dict(s.query(Object3D.id, Object3D.name))
+            self.view.index.refresh(s)
+
+        index = self.view.index
+        self.next_free.setText("Libre desde: " + ", ".join(
+            f"{name} {index.next_free(pid):%d/%m %H:%M}" for pid, name in self.view.printers
+        ))
+        self.view.setMinimumHeight(24 + ROW_H * len(self.view.printers))
+        self.view.update()